@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the display API that rpi_led_controller follows
+Serves /api/display (JSON), /api/display.rgb (raw RGB with an ETag),
+/api/display.delta (pixels changed since a sequence number), /api/latest,
+/api/processed/<file> and the /api/events push stream from in-memory state,
+so the controller can be tried without the real server:
+    python3 api_standin.py --folder ./media
+    LED_API_BASE=http://localhost:8000 python3 rpi_led_controller.py --no-hardware
+Change the state with POST /api/display ({"pixels": [[x, y, [r, g, b]], ...]},
+x 0-127 across both panels) and POST /api/latest ({"type": "gif", "files":
+[file_a, file_b]} naming files in --folder). --no-push answers /api/events
+with 404, like a server without push support, to exercise the polling
+fallback, --no-binary answers /api/display.rgb and /api/display.delta with
+404 to exercise the JSON one.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+from flask import Flask, Response, abort, jsonify, request, send_from_directory
+
+KEEPALIVE_INTERVAL = 15.0  # Seconds between keep-alive comments on an idle event stream
+DELTA_LOG_PIXELS = 4096  # Pixel changes kept for delta requests; clients further behind get a snapshot
+FRAME_BYTES = 128 * 64 * 3
+
+app = Flask(__name__)
+
+
+class DisplayState:
+    def __init__(self):
+        self.pixels = np.zeros((64, 128, 3), dtype=np.uint8)  # Panel A is x 0-63, panel B x 64-127
+        self.last_updated = datetime.now().isoformat()
+        self.etag = self._etag()
+        self._compressed = None  # gzip body for the current etag, made on first request
+        self.epoch = uuid.uuid4().hex[:8]  # Sequence numbers only mean something within one server run
+        self.seq = 0  # Bumped by every draw
+        self.log = deque()  # (seq, [(x, y, r, g, b), ...]) of recent draws, oldest first
+        self.log_pixels = 0
+        self.log_floor = 0  # Oldest sequence number a delta can start from
+        self.latest = {}
+        self.events = 0  # Number of the newest event
+        self.event_names = {}  # Event number -> name, for streams catching up
+        self._cond = threading.Condition()
+
+    def draw(self, pixels):
+        with self._cond:
+            changes = []
+            for x, y, rgb in pixels:
+                if 0 <= x < 128 and 0 <= y < 64:
+                    self.pixels[y, x] = rgb
+                    changes.append((x, y, *self.pixels[y, x].tolist()))
+            self.seq += 1
+            self.log.append((self.seq, changes))
+            self.log_pixels += len(changes)
+            while self.log_pixels > DELTA_LOG_PIXELS:
+                self.log_floor, dropped = self.log.popleft()
+                self.log_pixels -= len(dropped)
+            self.last_updated = datetime.now().isoformat()
+            self.etag = self._etag()
+            self._compressed = None
+        self.publish('display')
+
+    def _etag(self):
+        return hashlib.sha1(self.pixels.tobytes()).hexdigest()[:20]
+
+    def snapshot(self):
+        with self._cond:
+            return self.pixels.tolist(), self.last_updated
+
+    def delta(self, since, epoch):
+        """(kind, body, seq, last_updated) for a client holding state `since` of server run `epoch`.
+        kind is None when nothing changed, 'pixels' with 5 bytes (x, y, r, g, b) per changed
+        pixel, or 'snapshot' with the whole frame when the log doesn't reach back that far."""
+        with self._cond:
+            if epoch == self.epoch and since == self.seq:
+                return None, b'', self.seq, self.last_updated
+            if epoch == self.epoch and self.log_floor <= since < self.seq:
+                merged = {}
+                for seq, changes in self.log:
+                    if seq > since:
+                        for x, y, r, g, b in changes:
+                            merged[(x, y)] = (r, g, b)
+                if len(merged) * 5 < FRAME_BYTES:
+                    body = bytes(value for (x, y), rgb in merged.items() for value in (x, y, *rgb))
+                    return 'pixels', body, self.seq, self.last_updated
+            return 'snapshot', self.pixels.tobytes(), self.seq, self.last_updated
+
+    def rgb(self, compressed):
+        """(body, etag, last_updated) of the binary draw state"""
+        with self._cond:
+            if not compressed:
+                return self.pixels.tobytes(), self.etag, self.last_updated
+            if self._compressed is None:
+                self._compressed = gzip.compress(self.pixels.tobytes(), compresslevel=6)
+            return self._compressed, self.etag, self.last_updated
+
+    def publish(self, name):
+        with self._cond:
+            self.events += 1
+            self.event_names[self.events] = name
+            self.event_names.pop(self.events - 100, None)
+            self._cond.notify_all()
+
+    def wait_events(self, after, timeout):
+        """Event names newer than after (waiting up to timeout for one) and the newest event number"""
+        with self._cond:
+            if self.events <= after:
+                self._cond.wait(timeout)
+            names = [self.event_names[n] for n in range(after + 1, self.events + 1) if n in self.event_names]
+            return names, self.events
+
+
+state = DisplayState()
+options = None
+
+
+@app.route('/api/display', methods=['GET', 'POST'])
+def display():
+    if request.method == 'POST':
+        state.draw((request.json or {}).get('pixels', []))
+        return jsonify({'success': True})
+    pixels, last_updated = state.snapshot()
+    return jsonify({
+        'matrixA': [row[:64] for row in pixels],
+        'matrixB': [row[64:] for row in pixels],
+        'last_updated': last_updated,
+    })
+
+
+@app.route('/api/display.rgb')
+def display_rgb():
+    """128x64 RGB bytes, row-major, panel A in x 0-63; 304 when If-None-Match has the current ETag"""
+    if options.no_binary:
+        abort(404)
+    compressed = 'gzip' in request.accept_encodings
+    body, etag, last_updated = state.rgb(compressed)
+    headers = {'ETag': f'"{etag}"', 'X-Last-Updated': last_updated, 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    response = Response(body, mimetype='application/octet-stream', headers=headers)
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@app.route('/api/display.delta')
+def display_delta():
+    """Pixels changed since ?since=<seq>&epoch=<epoch>, or a snapshot; 304 when there are none.
+    X-Seq and X-Epoch name the state the response brings the client to."""
+    if options.no_binary:
+        abort(404)
+    kind, body, seq, last_updated = state.delta(request.args.get('since', -1, type=int), request.args.get('epoch'))
+    headers = {'X-Seq': str(seq), 'X-Epoch': state.epoch, 'X-Last-Updated': last_updated, 'Cache-Control': 'no-cache'}
+    if kind is None:
+        return Response(status=304, headers=headers)
+    headers['X-Delta'] = kind
+    response = Response(body, mimetype='application/octet-stream', headers=headers)
+    if kind == 'snapshot' and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@app.route('/api/latest', methods=['GET', 'POST'])
+def latest():
+    if request.method == 'POST':
+        data = request.json or {}
+        state.latest = {'type': data.get('type', 'gif'), 'files': data.get('files', []),
+                        'timestamp': datetime.now().isoformat()}
+        state.publish('latest')
+        return jsonify({'success': True})
+    return jsonify(state.latest)
+
+
+@app.route('/api/processed/<path:filename>')
+def processed(filename):
+    return send_from_directory(options.folder, filename)
+
+
+@app.route('/api/events')
+def events():
+    if options.no_push:
+        abort(404)
+
+    def stream():
+        seen = state.events
+        while True:
+            names, seen = state.wait_events(seen, KEEPALIVE_INTERVAL)
+            if not names:
+                yield ': keep-alive\n\n'
+            for name in names:
+                yield f'event: {name}\ndata: {json.dumps({"id": seen})}\n\n'
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+def main():
+    global options
+    parser = argparse.ArgumentParser(description="Stand-in display API server for rpi_led_controller")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--folder', default='.', help="Where /api/processed/ files are served from")
+    parser.add_argument('--no-push', action='store_true', help="No /api/events, clients have to poll")
+    parser.add_argument('--no-binary', action='store_true', help="No /api/display.rgb, clients have to read JSON")
+    options = parser.parse_args()
+    app.run(host=options.host, port=options.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of downloaded media for rpi_led_controller
+Each uploaded file the controller shows is kept twice: the bytes as served and
+its frames decoded to panel resolution (64x64 RGB, raw) with their durations.
+Entries are keyed by filename plus the server's ETag, or the content hash when
+the server sends none, and evicted least recently used once the cache grows
+past its size limit. The index survives restarts, together with the last
+upload shown, so the controller can put it back on the panels before the
+network is up and redownloads nothing it has seen.
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+
+from PIL import Image
+
+FRAME_SIZE = (64, 64)
+FRAME_BYTES = FRAME_SIZE[0] * FRAME_SIZE[1] * 3
+INDEX = 'index.json'
+# Files the cache writes: <32 hex key>.<ext or 'frames'>, optionally with .tmp while being written
+OWN_FILE = re.compile(r'[0-9a-f]{32}\.[a-z0-9]+(\.tmp)?$')
+ENTRY_FIELDS = ('key', 'etag', 'digest', 'bytes', 'durations', 'ext')
+
+
+class AssetCache:
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # filename -> entry dict, least recently used first
+        self.latest = None  # Upload metadata last shown, restored at startup
+        os.makedirs(folder, exist_ok=True)
+        self._load_index()
+
+    @property
+    def size_bytes(self):
+        return sum(entry['bytes'] for entry in self.entries.values())
+
+    def validator(self, filename):
+        """ETag to revalidate a cached file with, if the server gave one"""
+        entry = self.entries.get(filename)
+        return entry['etag'] if entry else None
+
+    def load(self, filename, digest=None):
+        """Cached (frames, durations) for filename, or None. With digest, only if the
+        cached content has that SHA-256 (servers without ETags)."""
+        entry = self.entries.get(filename)
+        if entry is None or (digest is not None and entry['digest'] != digest):
+            return None
+        try:
+            with open(self._path(entry, 'frames'), 'rb') as f:
+                data = f.read()
+        except OSError:
+            self._drop(filename)
+            self._save_index()
+            return None
+        if len(data) != FRAME_BYTES * len(entry['durations']):
+            self._drop(filename)
+            self._save_index()
+            return None
+        frames = [Image.frombytes('RGB', FRAME_SIZE, data[i:i + FRAME_BYTES])
+                  for i in range(0, len(data), FRAME_BYTES)]
+        self.entries.move_to_end(filename)
+        self._save_index()
+        return frames, list(entry['durations'])
+
+    def store(self, filename, etag, content, frames, durations):
+        """Keep a downloaded file and its decoded frames (FRAME_SIZE RGB images)"""
+        digest = hashlib.sha256(content).hexdigest()
+        frame_data = b''.join(frame.tobytes() for frame in frames)
+        size = len(content) + len(frame_data)
+        if size > self.max_bytes:
+            return  # Would evict everything else and still not fit
+
+        if filename in self.entries:
+            self._drop(filename)
+        key = hashlib.sha256(f'{filename}\0{etag or digest}'.encode()).hexdigest()[:32]
+        entry = {'key': key, 'etag': etag, 'digest': digest, 'bytes': size, 'durations': list(durations),
+                 'ext': filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'bin'}
+        try:
+            self._write(self._path(entry, entry['ext']), content)
+            self._write(self._path(entry, 'frames'), frame_data)
+        except OSError as e:
+            print(f"Not caching {filename}: {e}")
+            return
+        self.entries[filename] = entry
+        while self.size_bytes > self.max_bytes and len(self.entries) > 1:
+            self._drop(next(iter(self.entries)))
+        self._save_index()
+
+    def remember_latest(self, upload_data):
+        self.latest = upload_data
+        self._save_index()
+
+    def _path(self, entry, suffix):
+        return os.path.join(self.folder, f"{entry['key']}.{suffix}")
+
+    @staticmethod
+    def _write(path, data):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def _drop(self, filename):
+        entry = self.entries.pop(filename)
+        for suffix in (entry['ext'], 'frames'):
+            try:
+                os.remove(self._path(entry, suffix))
+            except OSError:
+                pass
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.folder, INDEX), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        if not isinstance(index, dict):
+            index = {}
+        self.latest = index.get('latest')
+        for item in index.get('entries', []):
+            try:
+                filename, entry = item
+                if all(field in entry for field in ENTRY_FIELDS) and os.path.exists(self._path(entry, 'frames')):
+                    self.entries[filename] = entry
+            except (TypeError, ValueError):
+                continue  # Malformed entry (index edited or from another version): its files go below
+        # Files of entries that were evicted or never indexed (crash mid-store). Only names the
+        # cache itself writes: LED_CACHE_DIR may point at a folder that holds other things too
+        known = {entry['key'] for entry in self.entries.values()}
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if OWN_FILE.match(name) and name.split('.', 1)[0] not in known and os.path.isfile(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if self.size_bytes > self.max_bytes:
+            # The limit was lowered since the last run
+            while self.size_bytes > self.max_bytes and self.entries:
+                self._drop(next(iter(self.entries)))
+            self._save_index()
+
+    def _save_index(self):
+        index = {'latest': self.latest, 'entries': list(self.entries.items())}
+        self._write(os.path.join(self.folder, INDEX), json.dumps(index).encode())
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+Rendering benchmark suite
+Measures frames/sec and per-frame latency of the media-to-panel pipeline on
+the virtual matrix, so it runs on any Linux box: _process_image (latency and
+peak RSS), GIF decode and frame memory (cached and streamed), MP4 decode, memory-mapped native
+frame playback, _safe_set_image for every rotation/mirror combination, the
+old per-pixel path against the compositor, dirty-pixel blitting, the latency
+of switching away from a playing GIF/MP4 and /draw request throughput
+through the Flask test client.
+
+Results can be written as JSON and compared with a previous run:
+    python3 bench_render.py --json base.json
+    python3 bench_render.py --compare base.json --threshold 0.25
+The compare run exits with status 1 when any benchmark got slower than the
+threshold allows.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from panel_compositor import PanelCompositor
+from virtual_matrix import RGBMatrix, RGBMatrixOptions
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+ROTATIONS = [180, 180]
+MIRRORS = [True, True]
+
+
+def virtual_canvas():
+    options = RGBMatrixOptions()
+    options.rows, options.cols, options.chain_length = 64, 64, 2
+    options.record_frames = 0
+    return RGBMatrix(options=options).CreateFrameCanvas()
+
+
+def legacy_set_image(canvas, image, rotations, mirrors):
+    """The pre-compositor _safe_set_image body"""
+    final_img = Image.new('RGB', (canvas.width, canvas.height), (0, 0, 0))
+    temp_bg = Image.new('RGB', (canvas.width, canvas.height), (0, 0, 0))
+    temp_bg.paste(image, (0, 0))
+
+    p1 = temp_bg.crop((0, 0, 64, 64))
+    if rotations[0] != 0:
+        p1 = p1.rotate(-rotations[0])
+    if mirrors[0]:
+        p1 = p1.transpose(Image.FLIP_LEFT_RIGHT)
+    final_img.paste(p1, (0, 0))
+
+    p2 = temp_bg.crop((64, 0, 128, 64))
+    if rotations[1] != 0:
+        p2 = p2.rotate(-rotations[1])
+    if mirrors[1]:
+        p2 = p2.transpose(Image.FLIP_LEFT_RIGHT)
+    final_img.paste(p2, (64, 0))
+
+    pixels = final_img.load()
+    for x in range(canvas.width):
+        for y in range(canvas.height):
+            r, g, b = pixels[x, y]
+            canvas.SetPixel(x, y, r, g, b)
+    return final_img
+
+
+class Suite:
+    def __init__(self, iterations, only=None):
+        self.iterations = iterations
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def measure(self, name, fn, iterations=None, items=1, setup=None):
+        """Time fn() per call; items is how many frames/requests one call handles"""
+        if not self.wanted(name):
+            return False
+        iterations = iterations or self.iterations
+        if setup:
+            setup()
+        fn()  # Warm-up: gather maps, decoder and codec initialization
+        samples = []
+        for _ in range(iterations):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+
+        samples.sort()
+        total = sum(samples)
+        per_item = [s / items * 1000 for s in samples]
+        r = self.results[name] = {
+            'fps': items * len(samples) / total if total else 0.0,
+            'ms_mean': sum(per_item) / len(per_item),
+            'ms_p50': per_item[len(per_item) // 2],
+            'ms_p95': per_item[min(len(per_item) - 1, int(len(per_item) * 0.95))],
+            'iterations': iterations,
+            'items': items,
+        }
+        print(f"{name:<44} {r['fps']:10.1f} /s  mean {r['ms_mean']:8.3f} ms  p95 {r['ms_p95']:8.3f} ms")
+        return True
+
+    def note(self, name, **values):
+        """Attach extra numbers (pixels written, memory, ...) to a result"""
+        if name in self.results:
+            self.results[name].update(values)
+
+
+def make_media(folder):
+    """Synthetic stand-ins for typical uploads"""
+    rng = np.random.default_rng(0)
+    paths = {}
+
+    # 12 MP phone photo: gradient rows plus noise so the JPEG size is realistic
+    h, w = 3000, 4000
+    gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+    photo = (gradient + rng.normal(0, 20, (h, 1, 3))).clip(0, 255).astype(np.uint8)
+    paths['jpeg_12mp'] = os.path.join(folder, 'photo.jpg')
+    Image.fromarray(photo).save(paths['jpeg_12mp'], quality=90)
+
+    # 24 MP: past the size where decoding at full resolution used to dominate
+    h, w = 4000, 6000
+    gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+    photo = (gradient + rng.normal(0, 20, (h, 1, 3))).clip(0, 255).astype(np.uint8)
+    paths['jpeg_24mp'] = os.path.join(folder, 'photo24.jpg')
+    Image.fromarray(photo).save(paths['jpeg_24mp'], quality=90)
+
+    # Screenshot-sized PNG, no draft mode for PNG so it is decoded in full
+    screen = np.zeros((3000, 4000, 3), dtype=np.uint8)
+    screen[..., 0] = np.linspace(0, 255, 4000, dtype=np.float32)[None, :]
+    screen[..., 1] = np.linspace(0, 255, 3000, dtype=np.float32)[:, None]
+    paths['png_12mp'] = os.path.join(folder, 'screen.png')
+    Image.fromarray(screen).save(paths['png_12mp'])
+
+    paths['png_512'] = os.path.join(folder, 'art.png')
+    Image.fromarray(rng.integers(0, 256, (512, 512, 3), dtype=np.uint8)).save(paths['png_512'])
+
+    frames = []
+    for i in range(40):
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        frame[:, :] = (i * 6, 40, 255 - i * 6)
+        frame[100:140, i * 7:i * 7 + 40] = (255, 255, 0)
+        frames.append(Image.fromarray(frame))
+    paths['gif_40f'] = os.path.join(folder, 'anim.gif')
+    frames[0].save(paths['gif_40f'], save_all=True, append_images=frames[1:], duration=40, loop=0)
+
+    # Photographic GIF at a typical upload size, resampling blends it past 256 colors
+    frames = []
+    for i in range(60):
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        frame[:, :, 0] = np.linspace(0, 255, 640, dtype=np.uint8)[None, :]
+        frame[:, :, 1] = np.linspace(255, 0, 480, dtype=np.uint8)[:, None]
+        frame[:, :, 2] = (i * 4) % 256
+        frame[200:280, i * 9:i * 9 + 80] = rng.integers(0, 256, (80, 80, 3), dtype=np.uint8)
+        frames.append(Image.fromarray(frame).quantize(256))
+    paths['gif_60f_photo'] = os.path.join(folder, 'photo.gif')
+    frames[0].save(paths['gif_60f_photo'], save_all=True, append_images=frames[1:], duration=50, loop=0)
+
+    paths['mp4_90f'] = os.path.join(folder, 'clip.mp4')
+    writer = cv2.VideoWriter(paths['mp4_90f'], cv2.VideoWriter_fourcc(*'mp4v'), 30, (640, 360))
+    for i in range(90):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        frame[:, :] = (i * 2, 80, 200 - i * 2)
+        frame[150:210, i * 6:i * 6 + 60] = (0, 255, 255)
+        writer.write(frame)
+    writer.release()
+    return paths
+
+
+# VmHWM rather than ru_maxrss: Linux carries the parent's ru_maxrss over into a forked child
+RSS_PROBE = '''
+import sys
+sys.argv.append('--no-hardware')
+import web_app
+
+def peak_kb():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+
+base = peak_kb()
+web_app.matrix_controller._process_image(sys.argv[1], sys.argv[2])
+print(peak_kb() - base)
+'''
+
+
+def process_image_peak_rss(path, mode):
+    """Peak RSS growth in KB of one _process_image call, in a fresh process so earlier runs don't hide it"""
+    # Same scratch working directory and instance path as this process, web_app imported from the repo
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-c', RSS_PROBE, path, mode], capture_output=True, text=True,
+                            check=True, env=env)
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def motion_sequences(rng, count=60):
+    """Static, low-motion (moving 8x8 sprite) and high-motion (noise) frame sequences"""
+    still = rng.integers(0, 256, (64, 128, 3), dtype=np.uint8)
+    low = []
+    for i in range(count):
+        frame = np.zeros((64, 128, 3), dtype=np.uint8)
+        x = (i * 2) % 120
+        frame[28:36, x:x + 8] = (255, 128, 0)
+        low.append(frame)
+    high = [rng.integers(0, 256, (64, 128, 3), dtype=np.uint8) for _ in range(count)]
+    return {'static': [still] * count, 'low-motion': low, 'high-motion': high}
+
+
+class RoundRobin:
+    """Hands out test frames in turn so no benchmark blits the same frame twice in a row"""
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    def __call__(self):
+        self.index = (self.index + 1) % len(self.frames)
+        return self.frames[self.index]
+
+
+def bench_compositor(suite, rng):
+    frames = [Image.fromarray(rng.integers(0, 256, (64, 128, 3), dtype=np.uint8)) for _ in range(8)]
+
+    # Sanity check: both paths must produce the same panel output
+    compositor = PanelCompositor()
+    for rotations in ([0, 0], [90, 180], [270, 0], [180, 180]):
+        for mirrors in ([False, False], [True, False], [True, True]):
+            expected = np.asarray(legacy_set_image(virtual_canvas(), frames[0], rotations, mirrors))
+            got = compositor.compose(np.asarray(frames[0]), rotations, mirrors)
+            assert np.array_equal(expected, got), f"Mismatch for {rotations} {mirrors}"
+
+    canvas = virtual_canvas()
+    next_frame = RoundRobin(frames)
+    suite.measure('compose/legacy_pil_setpixel', lambda: legacy_set_image(canvas, next_frame(), ROTATIONS, MIRRORS))
+
+    for label, bulk in (('setpixel_rows', False), ('setimage', True)):
+        compositor = PanelCompositor(bulk=bulk)
+
+        def vectorized():
+            frame = compositor.to_array(next_frame(), canvas.width, canvas.height)
+            compositor.invalidate()
+            compositor.blit(canvas, compositor.compose(frame, ROTATIONS, MIRRORS))
+
+        suite.measure(f'compose/gather_{label}', vectorized)
+
+
+def bench_diff_blit(suite, rng):
+    canvas = virtual_canvas()
+    # Full writes with SetPixel rows (bulk=False) and with SetImage(unsafe=False) as web_app does (_setimage)
+    for bulk, suffix in ((False, ''), (True, '_setimage')):
+        for name, sequence in motion_sequences(rng).items():
+            for label, diffed in (("full", False), ("diff", True)):
+                blitter = PanelCompositor(bulk=bulk)
+
+                def run():
+                    for frame in sequence:
+                        if not diffed:
+                            blitter.invalidate()
+                        blitter.blit(canvas, frame)
+                        blitter.swapped()
+
+                key = f'blit/{name}_{label}{suffix}'
+                iterations = max(2, suite.iterations // 10)
+                if suite.measure(key, run, iterations=iterations, items=len(sequence)):
+                    suite.note(key, px_per_frame=blitter.pixels_written / ((iterations + 1) * len(sequence)))
+
+    # Where diffing stops paying off against a full SetImage write: PanelCompositor.diff_ratio
+    base = rng.integers(0, 256, (64, 128, 3), dtype=np.uint8)
+    pixels = base.shape[0] * base.shape[1]
+    for percent in (10, 25, 50, 75, 100):
+        changed = base.copy()
+        picked = rng.choice(pixels, pixels * percent // 100, replace=False)
+        changed.reshape(-1, 3)[picked] ^= 0x80
+        for label, ratio in (('diff', 1.0), ('setimage', 0.0)):
+            blitter = PanelCompositor(diff_ratio=ratio)
+            frames = RoundRobin([base, changed])
+
+            def run():
+                # No swapped(), so one shadow alternates between the two frames and every blit sees `percent` changed
+                blitter.blit(canvas, frames())
+
+            suite.measure(f'blit/changed_{percent}pct_{label}', run)
+
+
+def bench_controller(suite, rng, media, quick):
+    import web_app  # Imported late: it reads --no-hardware from sys.argv at import time
+
+    mc = web_app.matrix_controller
+    canvas = virtual_canvas()
+    next_frame = RoundRobin([Image.fromarray(rng.integers(0, 256, (64, 128, 3), dtype=np.uint8)) for _ in range(8)])
+
+    saved = (mc.panel_rotations, mc.panel_mirrors)
+    try:
+        for rotation in (0, 90, 180, 270):
+            for mirrors in ([False, False], [True, False], [False, True], [True, True]):
+                mc.panel_rotations = [rotation, rotation]
+                mc.panel_mirrors = mirrors
+                flags = ''.join('m' if m else '-' for m in mirrors)
+                suite.measure(f'safe_set_image/rot{rotation}_mirror{flags}',
+                              lambda: mc._safe_set_image(canvas, next_frame()))
+    finally:
+        mc.panel_rotations, mc.panel_mirrors = saved
+
+    for name in ('jpeg_12mp', 'jpeg_24mp', 'png_12mp', 'png_512'):
+        for mode in ('split', 'clone'):
+            iterations = 2 if quick else (None if name == 'png_512' else 3)
+            result = f'process_image/{name}_{mode}'
+            # Stills are cached by digest since content-addressed uploads: time the decode, not a cache hit
+            suite.measure(result, lambda: mc._process_image(media[name], mode), iterations=iterations,
+                          setup=mc.frame_cache.clear)
+            if result in suite.results and name != 'png_512':
+                rss = process_image_peak_rss(media[name], mode)
+                suite.note(result, peak_rss_kb=rss)
+                print(f"{'':<40} peak RSS +{rss / 1024:.1f} MB")
+
+    gif_frames = len(mc._load_gif_frames(media['gif_40f'], 'clone'))
+    suite.measure('gif_decode/cold_40f_clone', lambda: mc._load_gif_frames(media['gif_40f'], 'clone'),
+                  iterations=2 if quick else 5, items=gif_frames, setup=mc.frame_cache.clear)
+    suite.measure('gif_decode/cached_40f_clone', lambda: mc._load_gif_frames(media['gif_40f'], 'clone'),
+                  items=gif_frames)
+
+    # Memory: retained size of the cached frames against plain RGB, and the peak while decoding
+    for name in ('gif_40f', 'gif_60f_photo'):
+        for mode in ('split', 'clone'):
+            result = f'gif_memory/{name}_{mode}'
+            if not suite.wanted(result):
+                continue
+            mc.frame_cache.clear()
+            tracemalloc.start()
+            frames = mc._load_gif_frames(media[name], mode)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            cached = mc.frame_cache.size_bytes
+            rgb = sum(frame.indices.size * 3 for frame, _ in frames)
+            suite.results[result] = {'frames': len(frames), 'cached_kb': cached / 1024, 'rgb_kb': rgb / 1024,
+                                     'peak_kb': peak / 1024}
+            print(f"{result:<40} {len(frames):>4} frames  cached {cached / 1024:8.1f} KB  "
+                  f"(RGB {rgb / 1024:8.1f} KB, {rgb / cached:.1f}x)  peak {peak / 1024:8.1f} KB")
+    mc.frame_cache.clear()
+
+    from video_pipeline import GifDecoder, VideoDecoder
+
+    # Streaming mode for GIFs over gif_stream_mb: peak while decoding one pass, nothing retained
+    for mode in ('split', 'clone'):
+        result = f'gif_memory/gif_60f_photo_{mode}_stream'
+        if not suite.wanted(result):
+            continue
+        tracemalloc.start()
+        decoder = GifDecoder(media['gif_60f_photo'], mode, mc.panel_rotations, mc.panel_mirrors, loop=False)
+        decoder.start()
+        count = 0
+        while decoder.get(timeout=5.0) is not None:
+            count += 1
+        decoder.stop()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        suite.results[result] = {'frames': count, 'peak_kb': peak / 1024}
+        print(f"{result:<40} {count:>4} frames  streamed, peak {peak / 1024:8.1f} KB")
+
+    def decode_mp4(mode):
+        decoder = VideoDecoder(media['mp4_90f'], mode, mc.panel_rotations, mc.panel_mirrors, loop=False, capacity=16)
+        decoder.start()
+        count = 0
+        while decoder.get(timeout=5.0) is not None:
+            count += 1
+        decoder.stop()
+        return count
+
+    mp4_frames = decode_mp4('split')
+    for mode in ('split', 'clone'):
+        suite.measure(f'mp4_decode/90f_{mode}', lambda: decode_mp4(mode),
+                      iterations=1 if quick else 3, items=mp4_frames)
+
+    import media_transcode
+
+    def read_native(native):
+        for index in range(len(native)):
+            mc.compositor.compose(native.layout(index), mc.panel_rotations, mc.panel_mirrors)
+
+    for mode in ('split', 'clone'):
+        media_transcode.transcode(media['mp4_90f'], mode)
+        native = media_transcode.open_native(media['mp4_90f'], mode)
+        suite.measure(f'native_frames/90f_{mode}', lambda: read_native(native), items=len(native))
+
+    bench_switch_latency(suite, web_app, media)
+    bench_draw_requests(suite, web_app)
+
+
+def bench_switch_latency(suite, web_app, media):
+    """Command posted -> first frame of the new content, measured by the controller itself"""
+    mc = web_app.matrix_controller
+    latency = mc.metrics.command_latency
+
+    def shown_after(post):
+        count, total = latency.count, latency.sum
+        post()
+        deadline = time.monotonic() + 5.0
+        while latency.count == count:
+            if time.monotonic() > deadline:
+                raise TimeoutError("No frame shown after the command")
+            time.sleep(0.0005)
+        return latency.sum - total
+
+    for name in ('gif_40f', 'mp4_90f'):
+        result = f'switch_latency/{name}_to_color'
+        if not suite.wanted(result):
+            continue
+        iterations = min(suite.iterations, 10)
+        samples = []
+        for i in range(iterations):
+            shown_after(lambda: mc.set_video(media[name], 'clone'))
+            time.sleep(0.05 + 0.1 * i / iterations)  # Land at different points of a frame's slot
+            samples.append(shown_after(lambda: mc.set_color(0, 0, 0)) * 1000)
+        samples.sort()
+        r = suite.results[result] = {
+            'ms_mean': sum(samples) / len(samples),
+            'ms_p50': samples[len(samples) // 2],
+            'ms_p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            'iterations': iterations,
+        }
+        print(f"{result:<44} {'':>13}  mean {r['ms_mean']:8.3f} ms  p95 {r['ms_p95']:8.3f} ms")
+
+
+def bench_draw_requests(suite, web_app):
+    users = web_app.load_users()
+    approved = [uid for uid, data in users.items() if data.get('is_approved')]
+    if not approved:
+        print("draw/*: skipped, no approved user in users.json")
+        return
+
+    client = web_app.app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = approved[0]
+        sess['_fresh'] = True
+
+    mc = web_app.matrix_controller
+    saved = mc.get_draw_buffer()
+    point = {'x': 10, 'y': 10, 'color': '#ff8800', 'size': 2}
+    batch = {'ops': [{'type': 'line', 'x0': i, 'y0': i % 64, 'x1': i + 8, 'y1': (i + 5) % 64,
+                      'color': '#00ff88', 'size': 1} for i in range(32)]}
+
+    def post(payload):
+        response = client.post('/draw', json=payload)
+        assert response.status_code == 200, response.data
+
+    suite.measure('draw/single_point_request', lambda: post(point), iterations=suite.iterations * 5)
+    suite.measure('draw/batched_32_lines_request', lambda: post(batch), iterations=suite.iterations * 2)
+
+    # Put the user's drawing back, the benchmark painted over it
+    with mc.draw_lock:
+        mc.draw_buffer[:] = saved
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every benchmark against a baseline; returns the names that regressed"""
+    regressions = []
+    print()
+    print(f"{'benchmark':<44} {'base':>10} {'now':>10} {'change':>8}")
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        # Timings compare mean ms, memory results compare peak KB
+        metric = 'ms_mean' if 'ms_mean' in result else 'peak_kb'
+        if not base or metric not in base or metric not in result:
+            continue
+        change = (result[metric] - base[metric]) / base[metric] if base[metric] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<44} {base[metric]:10.3f} {result[metric]:10.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True, cwd=REPO).strip()
+    except Exception:
+        return None
+
+
+def run_suite(args):
+    suite = Suite(5 if args.quick else args.iterations, args.only)
+    rng = np.random.default_rng(0)
+
+    print("=" * 90)
+    print("LED matrix rendering benchmarks (virtual matrix, 128x64)")
+    print("=" * 90)
+    bench_compositor(suite, rng)
+    bench_diff_blit(suite, rng)
+    with tempfile.TemporaryDirectory() as folder:
+        media = make_media(folder)
+        bench_controller(suite, rng, media, args.quick)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': suite.results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f).get('results', {})
+        regressions = compare(suite.results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LED matrix rendering benchmarks")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--quick', action='store_true', help="Fewer iterations, for smoke runs")
+    parser.add_argument('--only', action='append', help="Run benchmarks whose name contains this (repeatable)")
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--compare', help="Baseline JSON from an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+    # Relative to where the benchmark was started, not the scratch directory it runs in
+    args.json = args.json and os.path.abspath(args.json)
+    args.compare = args.compare and os.path.abspath(args.compare)
+
+    # The web app must come up on the virtual matrix
+    sys.argv.append('--no-hardware')
+    with tempfile.TemporaryDirectory() as workdir:
+        # web_app keeps settings, users and uploads relative to the working directory and creates
+        # media.db, blobs and transcodes on import: give it a scratch copy instead of the repo's
+        for name in ('settings.json', 'users.json'):
+            if os.path.exists(os.path.join(REPO, name)):
+                shutil.copy(os.path.join(REPO, name), workdir)
+        os.environ['LED_INSTANCE_PATH'] = os.path.join(workdir, 'instance')
+        os.chdir(workdir)
+        try:
+            run_suite(args)
+        finally:
+            os.chdir(REPO)
+
+
+if __name__ == "__main__":
+    main()
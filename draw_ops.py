@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Draw operations for the /draw API
+A request carries either a single legacy point ({x, y, color, size}) or a
+batch ({ops: [...]}) of points, line segments and fills. Every op expands
+into square brush stamps clipped to the 128x64 canvas.
+"""
+
+import numpy as np
+
+WIDTH = 128
+HEIGHT = 64
+MAX_BRUSH = 16
+MAX_OPS = 4096  # Per request, a stroke batched over one animation frame is far smaller
+
+
+def parse_color(color):
+    """Convert '#rrggbb' to an (r, g, b) tuple"""
+    h = str(color or '#000000').lstrip('#')
+    return tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
+
+
+def _coord(value, limit):
+    # Clamp so a bogus segment can't turn into a huge Bresenham walk
+    return max(-MAX_BRUSH, min(int(value), limit))
+
+
+def parse_ops(data):
+    """Normalize a /draw payload into a list of op tuples"""
+    if not isinstance(data, dict):
+        raise ValueError("draw request must be an object")
+    if 'ops' in data:
+        raw_ops = data['ops']
+        if not isinstance(raw_ops, list):
+            raise ValueError("ops must be a list")
+        if len(raw_ops) > MAX_OPS:
+            raise ValueError(f"Too many ops in one request (max {MAX_OPS})")
+    else:
+        raw_ops = [data]
+
+    ops = []
+    for op in raw_ops:
+        if not isinstance(op, dict):
+            raise ValueError(f"draw op must be an object, not {type(op).__name__}")
+        kind = op.get('type', 'point')
+        rgb = parse_color(op.get('color', '#000000'))
+        size = max(1, min(int(op.get('size', 1)), MAX_BRUSH))
+        if kind == 'point':
+            ops.append(('point', _coord(op.get('x', 0), WIDTH), _coord(op.get('y', 0), HEIGHT), size, rgb))
+        elif kind == 'line':
+            ops.append(('line', _coord(op['x0'], WIDTH), _coord(op['y0'], HEIGHT),
+                        _coord(op['x1'], WIDTH), _coord(op['y1'], HEIGHT), size, rgb))
+        elif kind == 'fill':
+            ops.append(('fill', rgb))
+        elif kind == 'clear':
+            ops.append(('fill', (0, 0, 0)))
+        else:
+            raise ValueError(f"Unknown draw op: {kind}")
+    return ops
+
+
+def _line_points(x0, y0, x1, y1):
+    """Bresenham line from (x0, y0) to (x1, y1), inclusive"""
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    err = dx + dy
+    while True:
+        yield x0, y0
+        if x0 == x1 and y0 == y1:
+            return
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x0 += sx
+        if e2 <= dx:
+            err += dx
+            y0 += sy
+
+
+def stamps(op):
+    """Expand an op into clipped (x0, y0, x1, y1, rgb) rectangles, end-exclusive"""
+    kind = op[0]
+    if kind == 'fill':
+        yield 0, 0, WIDTH, HEIGHT, op[1]
+        return
+
+    if kind == 'point':
+        _, x, y, size, rgb = op
+        points = [(x, y)]
+    else:
+        _, x0, y0, x1, y1, size, rgb = op
+        points = _line_points(x0, y0, x1, y1)
+
+    for x, y in points:
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + size, WIDTH), min(y + size, HEIGHT)
+        if left < right and top < bottom:
+            yield left, top, right, bottom, rgb
+
+
+def new_buffer():
+    return np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def apply_ops(buffer, ops):
+    """Paint ops into a HEIGHTxWIDTHx3 uint8 framebuffer"""
+    for op in ops:
+        for x0, y0, x1, y1, rgb in stamps(op):
+            buffer[y0:y1, x0:x1] = rgb
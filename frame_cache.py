@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Bounded LRU cache of pre-rendered frame sequences
+Entries are lists of (frame, duration) where each frame is already composed
+for the layout mode and the panel rotations/mirrors, so replaying a cached
+animation costs only a palette lookup and a blit per frame. Frames are kept
+as 8-bit palette indices (IndexedFrame), a third of the size of RGB; runs of
+frames whose colors fit in 256 entries together share one palette
+(SharedPalette), which for most GIFs means the whole animation does.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+
+class SharedPalette:
+    """Palette shared by consecutive frames of an animation. Colors are added exactly
+    while they fit in 256 entries; a frame that doesn't fit starts a new palette."""
+    __slots__ = ('colors', 'size', 'closed', '_keys', '_slots')
+
+    def __init__(self):
+        self.colors = np.zeros((256, 3), dtype=np.uint8)
+        self.size = 0
+        self.closed = False  # Holds a reduced frame's colors, nothing else can be added exactly
+        self._keys = np.zeros(0, dtype=np.uint32)  # Packed colors, sorted
+        self._slots = np.zeros(0, dtype=np.uint8)  # Palette index of each key
+
+    @property
+    def nbytes(self):
+        return self.colors.nbytes
+
+    def fit(self, rgb):
+        """uint8 indices for a HxWx3 uint8 frame with its colors added, or None if they don't fit"""
+        if self.closed:
+            return None
+        packed = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+        colors, inverse = np.unique(packed.ravel(), return_inverse=True)
+        known = np.zeros(len(colors), dtype=bool)
+        if len(self._keys):
+            positions = np.searchsorted(self._keys, colors).clip(max=len(self._keys) - 1)
+            known = self._keys[positions] == colors
+        new = colors[~known]
+        if self.size + len(new) > 256:
+            return None
+        if len(new):
+            self.colors[self.size:self.size + len(new)] = np.stack([new >> 16, (new >> 8) & 0xFF, new & 0xFF], axis=1)
+            keys = np.concatenate([self._keys, new])
+            slots = np.concatenate([self._slots, np.arange(self.size, self.size + len(new), dtype=np.uint8)])
+            order = np.argsort(keys)
+            self._keys, self._slots = keys[order], slots[order]
+            self.size += len(new)
+        return self._slots[np.searchsorted(self._keys, colors)][inverse].reshape(rgb.shape[:2])
+
+    def reduce(self, rgb):
+        """uint8 indices for a frame with more than 256 colors, reduced into this (empty) palette"""
+        # Resampling blended more colors in; reduce them back without dithering noise
+        image = Image.fromarray(rgb).quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        palette = np.asarray(image.getpalette(), dtype=np.uint8).reshape(-1, 3)[:256]
+        self.colors[:len(palette)] = palette
+        self.size = len(palette)
+        self.closed = True
+        return np.asarray(image)
+
+
+class IndexedFrame:
+    """A composed frame stored as uint8 palette indices, sharing the previous frame's palette when its colors fit"""
+    __slots__ = ('indices', 'palette')
+    MAX_BYTES = 64 * 128 + 256 * 3  # Panel-sized frame with a palette of its own
+
+    def __init__(self, rgb, palette=None):
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        indices = palette.fit(rgb) if palette is not None else None
+        if indices is None:
+            palette = SharedPalette()
+            # Exact: GIF frames and flat artwork rarely exceed 256 colors at panel resolution
+            indices = palette.fit(rgb)
+            if indices is None:
+                indices = palette.reduce(rgb)
+        self.indices = indices
+        self.palette = palette
+
+    def rgb(self):
+        """Expand to a HxWx3 uint8 frame"""
+        return self.palette.colors[self.indices]
+
+    @property
+    def nbytes(self):
+        """Size of the indices; FrameCache counts each palette once per sequence"""
+        return self.indices.nbytes
+
+
+def frame_cache_key(path, mode, rotations, mirrors, digest=None):
+    """Cache key for a media file rendered with a given layout; by content when its digest is known"""
+    source = (digest,) if digest else (os.path.abspath(path), os.path.getmtime(path))
+    return source + (mode, tuple(rotations), tuple(bool(m) for m in mirrors))
+
+
+class FrameCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (frames, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(frames):
+        palettes = {id(frame.palette): frame.palette for frame, _ in frames if isinstance(frame, IndexedFrame)}
+        return sum(frame.nbytes for frame, _ in frames) + sum(palette.nbytes for palette in palettes.values())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, key):
+        """Membership test that doesn't count as a hit or miss or refresh the entry"""
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, frames):
+        """Store a frame sequence, evicting least recently used entries to stay under the cap"""
+        nbytes = self._size(frames)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return False
+            self._entries[key] = (frames, nbytes)
+            self._bytes += nbytes
+            self._evict()
+            return True
+
+    def set_limit(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
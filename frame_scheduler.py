@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Drift-free frame scheduler
+Frames are paced against absolute monotonic deadlines, so decode and blit
+time is absorbed instead of added to every frame. A frame whose whole
+display slot has already passed is skipped to catch back up. The sleep
+function may return True when something woke it before the slot ended
+(MatrixController passes CommandQueue.wait), which sleep() passes on.
+"""
+
+import time
+from collections import deque
+
+RESYNC_AFTER = 1.0  # Seconds behind before the schedule restarts from now instead of skipping a burst
+
+
+class FrameScheduler:
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, history=300):
+        self.clock = clock
+        self._sleep = sleep
+        self.lateness = deque(maxlen=history)  # Seconds each shown frame started after its deadline
+        self.reset()
+
+    def reset(self):
+        """Restart the schedule with the first frame due now"""
+        self.next_deadline = self.clock()
+        self.frames = 0
+        self.skipped = 0
+        self.resyncs = 0
+        self.lateness.clear()
+
+    def begin(self, duration):
+        """Claim the next slot of `duration` seconds; returns False if the frame should be skipped"""
+        now = self.clock()
+        deadline = self.next_deadline
+        late = now - deadline
+
+        if late > RESYNC_AFTER:
+            # Paused or stalled (mode switch, network, settings reload): don't burn frames catching up
+            self.resyncs += 1
+            deadline = now
+            late = 0.0
+
+        self.next_deadline = deadline + duration
+        if duration > 0 and late > duration:
+            self.skipped += 1
+            return False
+
+        self.frames += 1
+        self.lateness.append(max(late, 0.0))
+        return True
+
+    def remaining(self):
+        """Seconds until the next frame is due (negative when behind)"""
+        return self.next_deadline - self.clock()
+
+    def sleep(self):
+        """Sleep only for what is left of the current frame's slot; True if woken before it ended"""
+        remaining = self.remaining()
+        if remaining > 0:
+            return bool(self._sleep(remaining))
+        return False
+
+    def stats(self):
+        samples = list(self.lateness)
+        if samples:
+            mean = sum(samples) / len(samples)
+            jitter = (sum((s - mean) ** 2 for s in samples) / len(samples)) ** 0.5
+            worst = max(samples)
+        else:
+            mean = jitter = worst = 0.0
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'resyncs': self.resyncs,
+            'mean_lateness_ms': mean * 1000,
+            'max_lateness_ms': worst * 1000,
+            'jitter_ms': jitter * 1000,
+        }
@@ -39,7 +39,7 @@ echo "========================================"
 echo ""
 echo "Next steps:"
 echo "1. Edit rpi_led_controller.py and set your server IP:"
-echo "   API_URL = 'http://YOUR_SERVER_IP:8000/api/display'"
+echo "   API_BASE = ... 'http://YOUR_SERVER_IP:8000'  (or export LED_API_BASE)"
 echo ""
 echo "2. Test the controller:"
 echo "   sudo python3 rpi_led_controller.py"
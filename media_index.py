@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+SQLite index of the SD card media folder
+One row per media file with its layout mode (from the JSON sidecar), size,
+mtime, dimensions, frame count, duration and content hash, so listings and
+the slideshow never touch the folder or decode anything. The folder is
+rescanned only when its mtime changes, and only files whose mtime/size moved
+are re-read. Dimensions, frames, duration and hash are probed by a background
+thread after a file is indexed; until then those columns are NULL.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import cv2
+from PIL import Image
+
+MEDIA_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'mp4')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    filename TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    config_mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    frames INTEGER,
+    duration REAL,
+    sha256 TEXT
+)
+"""
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _read_mode(path):
+    try:
+        with open(path + '.json', 'r') as f:
+            return json.load(f).get('mode', 'clone')
+    except:
+        return 'clone'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def probe(path):
+    """(width, height, frames, duration in seconds or None for stills)"""
+    ext = path.rsplit('.', 1)[-1].lower()
+    if ext == 'mp4':
+        cap = cv2.VideoCapture(path)
+        try:
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    frames, frames / fps if fps > 0 else None)
+        finally:
+            cap.release()
+
+    with Image.open(path) as img:
+        if ext != 'gif':
+            return img.width, img.height, 1, None
+        frames, duration = 0, 0.0
+        try:
+            while True:
+                duration += img.info.get('duration', 100) / 1000.0
+                frames += 1
+                img.seek(img.tell() + 1)
+        except EOFError:
+            pass
+        return img.width, img.height, frames, duration
+
+
+class MediaIndex:
+    def __init__(self, db_path, folder):
+        self.folder = folder
+        self._folder_mtime = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(SCHEMA)
+        self._probe_event = threading.Event()
+        self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+        self._prober.start()
+
+    def refresh(self, force=False):
+        """Sync the index with the folder; a no-op unless the folder mtime changed"""
+        folder_mtime = _mtime_ns(self.folder)
+        if not force and folder_mtime == self._folder_mtime:
+            return
+        with self._lock:
+            indexed = {row['filename']: (row['mtime_ns'], row['size'], row['config_mtime_ns'])
+                       for row in self._db.execute('SELECT filename, mtime_ns, size, config_mtime_ns FROM media')}
+            present = set()
+            with self._db:
+                for filename in os.listdir(self.folder):
+                    if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in MEDIA_EXTENSIONS:
+                        continue
+                    present.add(filename)
+                    self._update(filename, indexed.get(filename))
+                gone = [(filename,) for filename in indexed if filename not in present]
+                self._db.executemany('DELETE FROM media WHERE filename = ?', gone)
+            self._folder_mtime = folder_mtime
+        self._probe_event.set()
+
+    def refresh_file(self, filename):
+        """Re-index one file right after it was written (uploads may overwrite in place)"""
+        with self._lock, self._db:
+            row = self._db.execute('SELECT mtime_ns, size, config_mtime_ns FROM media WHERE filename = ?',
+                                   (filename,)).fetchone()
+            self._update(filename, tuple(row) if row else None)
+        self._probe_event.set()
+
+    def _update(self, filename, known):
+        path = os.path.join(self.folder, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._db.execute('DELETE FROM media WHERE filename = ?', (filename,))
+            return
+        config_mtime = _mtime_ns(path + '.json')
+        if known == (st.st_mtime_ns, st.st_size, config_mtime):
+            return
+        if known is not None and known[:2] == (st.st_mtime_ns, st.st_size):
+            # Only the sidecar changed (same content uploaded again): keep what was probed
+            self._db.execute('UPDATE media SET mode = ?, config_mtime_ns = ? WHERE filename = ?',
+                             (_read_mode(path), config_mtime, filename))
+            return
+        # Content changed: probed columns are cleared and filled in again by the prober
+        self._db.execute(
+            'INSERT OR REPLACE INTO media (filename, type, mode, mtime_ns, size, config_mtime_ns) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, filename.rsplit('.', 1)[1].lower(), _read_mode(path),
+             st.st_mtime_ns, st.st_size, config_mtime))
+
+    def remove(self, filename):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM media WHERE filename = ?', (filename,))
+
+    def get(self, filename):
+        self.refresh()
+        with self._lock:
+            row = self._db.execute('SELECT * FROM media WHERE filename = ?', (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def page(self, offset=0, limit=None):
+        """(rows, total) in filename order"""
+        self.refresh()
+        with self._lock:
+            total = self._db.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+            rows = self._db.execute('SELECT * FROM media ORDER BY filename LIMIT ? OFFSET ?',
+                                    (-1 if limit is None else limit, offset)).fetchall()
+        return [dict(row) for row in rows], total
+
+    def filenames(self):
+        self.refresh()
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT filename FROM media ORDER BY filename')]
+
+    def _probe_loop(self):
+        while True:
+            self._probe_event.wait()
+            self._probe_event.clear()
+            while True:
+                with self._lock:
+                    row = self._db.execute('SELECT filename, mtime_ns FROM media WHERE sha256 IS NULL LIMIT 1').fetchone()
+                if row is None:
+                    break
+                filename, mtime_ns = row
+                path = os.path.join(self.folder, filename)
+                try:
+                    values = probe(path) + (file_hash(path),)
+                except Exception as e:
+                    print(f"Error probing {filename}: {e}")
+                    values = (None, None, None, None, '')  # Empty hash: unreadable, don't retry until it changes
+                with self._lock, self._db:
+                    # Skipped if the file was replaced while it was being probed
+                    self._db.execute('UPDATE media SET width = ?, height = ?, frames = ?, duration = ?, sha256 = ? '
+                                     'WHERE filename = ? AND mtime_ns = ?', values + (filename, mtime_ns))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Media preprocessing in worker processes
+Decoding uploads (PIL, OpenCV) holds the GIL for long stretches, so doing it
+on request threads or the render thread stalls the web UI and the running
+animation. MediaJobs runs media_transcode.transcode in a bounded process pool
+instead: every upload becomes a job with an id, its progress is reported back
+from the worker through a queue, and an on_done callback hands the result to
+the display once the native frame file is written. Playback then only maps
+that file.
+Workers come from a forkserver, a clean interpreter started before the server
+has threads or has used OpenCV, never from the running server itself. They
+exit when the server does.
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import media_transcode
+
+KEEP_FINISHED = 100  # Finished jobs kept for the status endpoint
+PROGRESS_INTERVAL = 0.2  # Seconds between progress reports from a worker
+
+_progress_queue = None  # Set in each worker process
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    # One decode per core is the parallelism; OpenCV's own thread pool would only compete with it
+    import cv2
+    cv2.setNumThreads(1)
+    # An idle worker blocks on the call queue, which doesn't close when the server dies
+    threading.Thread(target=_exit_with_parent, daemon=True).start()
+
+
+def _exit_with_parent():
+    multiprocessing.connection.wait([multiprocessing.parent_process().sentinel])
+    os._exit(0)
+
+
+def _run(job_id, path, mode):
+    """Worker side of a job; returns whether a native file was written"""
+    last = [0.0]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if done == 0 or now - last[0] >= PROGRESS_INTERVAL:
+            last[0] = now
+            _progress_queue.put((job_id, done, total))
+
+    return media_transcode.transcode(path, mode, progress)
+
+
+class Job:
+    def __init__(self, path, mode, filename, on_done):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.mode = mode
+        self.filename = filename
+        self.state = 'queued'  # queued, running, done, failed
+        self.frames_done = 0
+        self.frames_total = None
+        self.native = None  # True if the result plays from a native file, False if it was too large
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.done_event = threading.Event()
+        self.callbacks = [on_done] if on_done else []
+
+    def to_dict(self):
+        progress = None
+        if self.state == 'done':
+            progress = 1.0
+        elif self.frames_total:
+            progress = min(1.0, self.frames_done / self.frames_total)
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'mode': self.mode,
+            'state': self.state,
+            'progress': progress,
+            'frames_done': self.frames_done,
+            'frames_total': self.frames_total,
+            'native': self.native,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+
+class MediaJobs:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 4
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> Job, oldest first
+        self._active = {}  # (path, mode) -> Job not finished yet
+        # Forking the server would copy its threads' locks and OpenCV's thread pool mid-use into the workers
+        self._context = multiprocessing.get_context('forkserver')
+        self._context.set_forkserver_preload(['media_jobs'])
+        self._progress = self._context.Queue()
+        self._pool_lock = threading.Lock()
+        self._pool = self._new_pool()
+        threading.Thread(target=self._progress_loop, daemon=True).start()
+
+    def _new_pool(self):
+        pool = ProcessPoolExecutor(self.workers, mp_context=self._context,
+                                   initializer=_init_worker, initargs=(self._progress,))
+        # Starts the forkserver (once) and a worker now rather than on the first upload
+        pool.submit(int).result()
+        return pool
+
+    def submit(self, path, mode, filename=None, on_done=None, bounded=True):
+        """Queue path for preprocessing in mode; returns the Job.
+        An unfinished job for the same file and mode is shared rather than queued twice.
+        on_done(job) runs once the job succeeded: on a pool thread, or right away if there was nothing to decode.
+        Raises JobQueueFull when bounded and max_pending jobs are already waiting."""
+        with self._lock:
+            job = self._active.get((path, mode))
+            if job is not None:
+                if on_done:
+                    job.callbacks.append(on_done)
+                return job
+            if bounded and len(self._active) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._active)} media jobs pending")
+            job = Job(path, mode, filename or os.path.basename(path), on_done)
+            self._jobs[job.id] = job
+            self._trim()
+            if media_transcode.is_current(path, mode):
+                # Already processed (same content uploaded before): nothing to decode
+                job.native = True
+                finished = True
+            else:
+                self._active[(path, mode)] = job
+                finished = False
+        if finished:
+            self._finish(job, None)
+            return job
+        with self._pool_lock:
+            try:
+                future = self._pool.submit(_run, job.id, path, mode)
+            except BrokenProcessPool:
+                # A worker died (out of memory on a huge file): start a fresh pool, forked by the forkserver
+                print("Media worker pool broken, restarting it")
+                self._pool = self._new_pool()
+                future = self._pool.submit(_run, job.id, path, mode)
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def check_capacity(self):
+        """Raise JobQueueFull if a bounded submit would be refused right now. Upload routes call this
+        before saving anything and then submit with bounded=False, so a file they kept is never
+        reported as refused."""
+        with self._lock:
+            if len(self._active) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._active)} media jobs pending")
+
+    def run(self, path, mode):
+        """Process path in the pool and wait for it (background backfill; not counted against the bound)"""
+        job = self.submit(path, mode, bounded=False)
+        job.done_event.wait()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def pending(self):
+        with self._lock:
+            return len(self._active)
+
+    def _finish(self, job, future):
+        error = None
+        if future is not None:
+            try:
+                job.native = future.result()
+            except Exception as e:
+                error = e
+        with self._lock:
+            self._active.pop((job.path, job.mode), None)
+            job.finished = time.time()
+            if error is not None:
+                job.state = 'failed'
+                job.error = str(error) or type(error).__name__
+            else:
+                job.state = 'done'
+            callbacks = job.callbacks
+        job.done_event.set()
+        if error is not None:
+            print(f"Error preprocessing {job.path}: {error}")
+            return
+        for callback in callbacks:
+            try:
+                callback(job)
+            except Exception as e:
+                print(f"Error handing over {job.path}: {e}")
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job_id]
+
+    def _progress_loop(self):
+        while True:
+            job_id, done, total = self._progress.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.finished is not None:
+                    continue
+                job.state = 'running'
+                job.frames_done = done
+                job.frames_total = total
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Content-addressed media blobs
+Uploads are hashed while they are written and kept once per content, as
+<sha256>.<ext> in the blob folder. live_cache and sd_card entries are hard
+links to the blob, so the same content uploaded twice (or to both places)
+is stored once and everything derived from it (cached frames, transcodes)
+is keyed by the digest and shared. A blob is dropped by gc() once no folder
+links to it any more.
+"""
+
+import hashlib
+import os
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_hashed(source, path):
+    """Copy a readable stream to path in chunks; returns the SHA-256 hex digest"""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """SHA-256 hex digest of a file on disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._inodes = {}  # (st_dev, st_ino) -> digest
+        for name in os.listdir(folder):
+            if self._is_blob(name):
+                st = os.stat(os.path.join(folder, name))
+                self._inodes[(st.st_dev, st.st_ino)] = name.split('.', 1)[0]
+
+    @staticmethod
+    def _is_blob(name):
+        digest, _, ext = name.partition('.')
+        return len(digest) == 64 and ext and '.' not in ext
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.folder, f'{digest}.{ext}')
+
+    def adopt(self, written, digest, path):
+        """Move a freshly written upload to path as a link to the blob for digest.
+        Known content links path to the existing blob and drops the new bytes,
+        so its mtime and everything derived from it stay valid; new content
+        becomes the blob. Uploads are always written to a separate file first:
+        writing into path directly would modify a blob other links share.
+        Returns False where hard links aren't supported (path is then a plain file)."""
+        blob = self.blob_path(digest, path.rsplit('.', 1)[-1].lower())
+        with self._lock:
+            try:
+                if os.path.exists(blob):
+                    os.link(blob, written + '.link')
+                    os.replace(written + '.link', path)
+                    os.remove(written)
+                else:
+                    os.link(written, blob)
+                    os.replace(written, path)
+            except OSError as e:
+                print(f"Not deduplicating {path}: {e}")
+                os.replace(written, path)
+                return False
+            st = os.stat(blob)
+            self._inodes[(st.st_dev, st.st_ino)] = digest
+        return True
+
+    def digest_of(self, path):
+        """Digest of the blob path links to, or None for files outside the store"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return self._inodes.get((st.st_dev, st.st_ino))
+
+    def canonical(self, path):
+        """The blob path for a linked file, so derived files (transcodes) are shared; path otherwise"""
+        digest = self.digest_of(path)
+        if digest is None:
+            return path
+        return self.blob_path(digest, path.rsplit('.', 1)[-1].lower())
+
+    def gc(self):
+        """Remove blobs nothing links to any more, with their derived files"""
+        removed = 0
+        with self._lock:
+            names = os.listdir(self.folder)
+            for name in names:
+                if not self._is_blob(name):
+                    continue
+                blob = os.path.join(self.folder, name)
+                st = os.stat(blob)
+                if st.st_nlink > 1:
+                    continue
+                for derived in names:
+                    if derived != name and derived.startswith(name + '.'):
+                        os.remove(os.path.join(self.folder, derived))
+                os.remove(blob)
+                self._inodes.pop((st.st_dev, st.st_ino), None)
+                removed += 1
+        return removed
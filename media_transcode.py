@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Panel-native media container
+SD card uploads are transcoded once, in the background, into a raw frame file
+next to the original (<file>.<mode>.frames, next to the blob for deduplicated
+uploads): fixed header, uint8 RGB frames at panel
+resolution for the upload's layout mode (128x64 for split, 64x64 otherwise),
+then a float32 per-frame duration table. Playback memory-maps the file and
+hands frame views straight to the compositor, with no decoding or rescaling.
+Rotations and mirrors are applied at playback, so changing them doesn't
+invalidate the transcode.
+"""
+
+import os
+import queue
+import struct
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+MAGIC = b'LEDF'
+VERSION = 1
+# magic, version, width, height, mode, source mtime_ns, source size, frame count
+HEADER = struct.Struct('<4sHHH16sqqI')
+SUFFIX = '.frames'
+MAX_BYTES = 256 * 1024 * 1024  # Longer clips keep decoding from the original
+STILL_EXTENSIONS = ('jpg', 'jpeg', 'png')
+MAX_DECODE_PIXELS = 50 * 1000 * 1000  # ~150 MB as RGB, anything larger is treated as a decompression bomb
+
+
+def native_path(path, mode):
+    return f'{path}.{mode}{SUFFIX}'
+
+
+def panel_size(mode):
+    return (128, 64) if mode == 'split' else (64, 64)
+
+
+def _gif_frames(path, size):
+    gif = Image.open(path)
+    try:
+        while True:
+            # Same resize as MatrixController._render_layout
+            frame = gif.copy().convert('RGB').resize(size)
+            yield np.asarray(frame), gif.info.get('duration', 100) / 1000.0
+            gif.seek(gif.tell() + 1)
+    except EOFError:
+        pass
+
+
+def _mp4_frames(path, size):
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Failed to open video: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        duration = 1.0 / (fps if fps > 0 else 30.0)
+        while True:
+            ret, bgr = cap.read()
+            if not ret:
+                break
+            # Same resize as VideoDecoder, channels swapped to RGB
+            yield cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)[..., ::-1], duration
+    finally:
+        cap.release()
+
+
+def load_thumbnail(path, size):
+    """Decode an image fitted into size, letting the decoder skip the detail that would be thrown away"""
+    img = Image.open(path)
+    # Only the header is read so far. Keep at least 2x the final size for the LANCZOS pass
+    scale = min(size[0] / img.width, size[1] / img.height, 0.5)
+    wanted = (max(1, int(img.width * scale * 2)), max(1, int(img.height * scale * 2)))
+    # JPEG decodes at 1/2, 1/4 or 1/8 scale when asked; img.size is then the decoded size
+    img.draft('RGB', wanted)
+    if img.width * img.height > MAX_DECODE_PIXELS:
+        raise ValueError(f"Image too large to decode ({img.width}x{img.height})")
+    # Other formats decode at full size; shrink by a box filter before resampling
+    factor = int(min(img.width / wanted[0], img.height / wanted[1]))
+    if factor > 1 and img.mode in ('L', 'RGB', 'RGBA'):
+        img = img.reduce(factor)
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img
+
+
+def _still_frame(path, size):
+    # Same fit-and-center as MatrixController._process_image
+    img = load_thumbnail(path, size)
+    bg = Image.new('RGB', size, (0, 0, 0))
+    bg.paste(img, ((size[0] - img.width) // 2, (size[1] - img.height) // 2))
+    yield np.asarray(bg), 0.0
+
+
+def _source_frames(path, size):
+    ext = path.rsplit('.', 1)[-1].lower()
+    if ext == 'gif':
+        return _gif_frames(path, size)
+    if ext == 'mp4':
+        return _mp4_frames(path, size)
+    if ext in STILL_EXTENSIONS:
+        return _still_frame(path, size)
+    raise ValueError(f"Unsupported media type: {path}")
+
+
+def frame_total(path):
+    """Number of frames transcode will write for path, or None if the container doesn't say"""
+    ext = path.rsplit('.', 1)[-1].lower()
+    if ext in STILL_EXTENSIONS:
+        return 1
+    if ext == 'gif':
+        with Image.open(path) as gif:
+            return getattr(gif, 'n_frames', 1)
+    cap = cv2.VideoCapture(path)
+    try:
+        count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return count if count > 0 else None
+    finally:
+        cap.release()
+
+
+def transcode(path, mode, progress=None):
+    """Write the native frame file for path; returns False if it was too large to keep.
+    progress(done, total) is called before the first frame and after each one."""
+    width, height = panel_size(mode)
+    frame_bytes = width * height * 3
+    st = os.stat(path)
+    target = native_path(path, mode)
+    tmp = target + '.tmp'
+    durations = []
+    total = frame_total(path) if progress else None
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(b'\0' * HEADER.size)  # Rewritten once the frame count is known
+            if progress:
+                progress(0, total)
+            for frame, duration in _source_frames(path, (width, height)):
+                if (len(durations) + 1) * frame_bytes > MAX_BYTES:
+                    raise OverflowError
+                f.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+                durations.append(duration)
+                if progress:
+                    progress(len(durations), total)
+            if not durations:
+                raise ValueError(f"No frames in {path}")
+            f.write(np.asarray(durations, dtype='<f4').tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, width, height, mode.encode(),
+                                st.st_mtime_ns, st.st_size, len(durations)))
+        os.replace(tmp, target)
+        return True
+    except OverflowError:
+        print(f"Not transcoding {path}: larger than {MAX_BYTES // (1024 * 1024)} MB at panel resolution")
+        return False
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def is_current(path, mode):
+    """True if the native file exists and matches the source and mode"""
+    return _read_header(path, mode) is not None
+
+
+def _read_header(path, mode):
+    try:
+        st = os.stat(path)
+        with open(native_path(path, mode), 'rb') as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) != HEADER.size:
+        return None
+    magic, version, width, height, stored_mode, mtime_ns, size, count = HEADER.unpack(header)
+    if (magic != MAGIC or version != VERSION or stored_mode.rstrip(b'\0').decode() != mode
+            or mtime_ns != st.st_mtime_ns or size != st.st_size or count == 0):
+        return None
+    return width, height, count
+
+
+class NativeMedia:
+    """Memory-mapped frames of a transcoded file"""
+    def __init__(self, path, mode, width, height, count):
+        self.mode = mode
+        self.frames = np.memmap(native_path(path, mode), dtype=np.uint8, mode='r', offset=HEADER.size,
+                                shape=(count, height, width, 3))
+        self.durations = np.memmap(native_path(path, mode), dtype='<f4', mode='r',
+                                   offset=HEADER.size + count * height * width * 3, shape=(count,)).tolist()
+        self._layout = np.zeros((64, 128, 3), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.durations)
+
+    def layout(self, index):
+        """Frame index placed on the 128x64 canvas; the returned array is reused between calls"""
+        frame = self.frames[index]
+        if self.mode == 'split':
+            return frame
+        layout = self._layout
+        if self.mode in ('clone', 'matrix_a'):
+            layout[:, :64] = frame
+        if self.mode in ('clone', 'matrix_b'):
+            layout[:, 64:] = frame
+        return layout
+
+
+def open_native(path, mode):
+    """NativeMedia for an up to date transcode of path, otherwise None"""
+    header = _read_header(path, mode)
+    if header is None:
+        return None
+    try:
+        return NativeMedia(path, mode, *header)
+    except (OSError, ValueError):
+        return None
+
+
+def remove(path):
+    """Delete the transcodes of path in every mode"""
+    folder, name = os.path.split(path)
+    for candidate in os.listdir(folder or '.'):
+        if candidate.startswith(name + '.') and candidate.endswith(SUFFIX):
+            os.remove(os.path.join(folder, candidate))
+
+
+class Transcoder(threading.Thread):
+    """Background feeder for files nobody is waiting on (startup backfill), one at a time so
+    uploads always get ahead of it. run_job(path, mode) does the work and returns when it's done."""
+    def __init__(self, run_job=transcode):
+        super().__init__(daemon=True)
+        self.run_job = run_job
+        self.jobs = queue.Queue()
+        self.pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, path, mode):
+        with self._lock:
+            if (path, mode) in self.pending:
+                return
+            self.pending.add((path, mode))
+        self.jobs.put((path, mode))
+
+    def backfill(self, folder, mode_for, resolve=lambda path: path):
+        """Queue every media file in folder whose transcode is missing or stale.
+        resolve maps a file to the path its transcode is kept next to."""
+        for filename in sorted(os.listdir(folder)):
+            ext = filename.rsplit('.', 1)[-1].lower()
+            if ext not in ('gif', 'mp4') + STILL_EXTENSIONS:
+                continue
+            path = os.path.join(folder, filename)
+            mode = mode_for(path)
+            path = resolve(path)
+            if not is_current(path, mode):
+                self.submit(path, mode)
+
+    def run(self):
+        while True:
+            path, mode = self.jobs.get()
+            try:
+                if os.path.exists(path) and not is_current(path, mode):
+                    self.run_job(path, mode)
+            except Exception as e:
+                print(f"Error transcoding {path}: {e}")
+            finally:
+                with self._lock:
+                    self.pending.discard((path, mode))
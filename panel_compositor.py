@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Panel compositor for the daisy-chained 64x64 LED panels
+Rotates and mirrors each panel of a frame with one NumPy gather instead of
+cropping/rotating PIL images and calling SetPixel per pixel from Python.
+Blits are diffed against the last frame written to each of the two
+double-buffered canvases, so only changed pixels are rewritten.
+"""
+
+import numpy as np
+from PIL import Image
+
+PANEL_SIZE = 64
+
+
+class PanelCompositor:
+    def __init__(self, bulk=True, diff_ratio=0.5):
+        self.bulk = bulk  # Full writes via canvas.SetImage(unsafe=False): still one SetPixel per pixel, but looped in the binding
+        self.diff_ratio = diff_ratio  # Above this fraction of changed pixels a full write is cheaper (blit/changed_* in bench_render.py)
+        self._map = (None, None)  # (layout key, gather map), swapped as one tuple so threads never mix them
+
+        # Last frame written to the back buffer and to the front buffer (swapped on every SwapOnVSync)
+        self._shadows = [None, None]
+        self._back = 0
+
+        # Stats
+        self.full_writes = 0
+        self.diff_writes = 0
+        self.skipped_writes = 0
+        self.pixels_written = 0
+
+    def index_map(self, width, height, rotations, mirrors):
+        """Return the flat gather map for the given layout, rebuilding it only when the layout changes"""
+        key = (width, height, tuple(rotations), tuple(bool(m) for m in mirrors))
+        cached_key, index_map = self._map
+        if key != cached_key:
+            index_map = self._build_map(width, height, rotations, mirrors)
+            self._map = (key, index_map)
+        return index_map
+
+    def _build_map(self, width, height, rotations, mirrors):
+        """Output pixel i of the composed frame is source pixel map[i]"""
+        idx = np.arange(width * height, dtype=np.intp).reshape(height, width)
+        out = idx.copy()
+        if height != PANEL_SIZE:
+            return out.ravel()
+
+        for p in range(width // PANEL_SIZE):
+            x0 = p * PANEL_SIZE
+            panel = idx[:, x0:x0 + PANEL_SIZE]
+            rotation = rotations[p] if p < len(rotations) else 0
+            if rotation % 360:
+                # PIL rotate(-r) turns the panel r degrees clockwise, rot90 with negative k does the same
+                panel = np.rot90(panel, k=-(int(rotation) // 90))
+            if p < len(mirrors) and mirrors[p]:
+                panel = panel[:, ::-1]
+            out[:, x0:x0 + PANEL_SIZE] = panel
+        return out.ravel()
+
+    def to_array(self, image, width, height):
+        """Convert a PIL image or array to a uint8 canvas-sized frame, anchored top-left on black"""
+        if isinstance(image, Image.Image):
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            frame = np.asarray(image)
+        else:
+            frame = np.asarray(image, dtype=np.uint8)
+
+        if frame.shape[:2] == (height, width):
+            return frame
+        padded = np.zeros((height, width, 3), dtype=np.uint8)
+        h = min(height, frame.shape[0])
+        w = min(width, frame.shape[1])
+        padded[:h, :w] = frame[:h, :w, :3]
+        return padded
+
+    def compose(self, frame, rotations, mirrors):
+        """Apply the per-panel rotations/mirrors to a canvas-sized frame"""
+        height, width = frame.shape[:2]
+        index_map = self.index_map(width, height, rotations, mirrors)
+        return frame.reshape(-1, 3).take(index_map, axis=0).reshape(height, width, 3)
+
+    def swapped(self):
+        """Call after SwapOnVSync: the returned canvas is the buffer that was on screen"""
+        self._back ^= 1
+
+    def invalidate(self):
+        """Forget buffer contents after anything but blit() wrote to the canvases"""
+        self._shadows = [None, None]
+
+    def blit(self, canvas, frame):
+        """Push a composed frame to the canvas, rewriting only pixels that differ from its last contents"""
+        shadow = self._shadows[self._back]
+        if shadow is not None and shadow.shape == frame.shape:
+            ys, xs = np.nonzero((frame != shadow).any(axis=2))
+            count = len(ys)
+            if count == 0:
+                self.skipped_writes += 1
+            elif count <= self.diff_ratio * frame.shape[0] * frame.shape[1]:
+                set_pixel = canvas.SetPixel
+                for y, x, (r, g, b) in zip(ys.tolist(), xs.tolist(), frame[ys, xs].tolist()):
+                    set_pixel(x, y, r, g, b)
+                self.diff_writes += 1
+                self.pixels_written += count
+            else:
+                self._write_full(canvas, frame)
+        else:
+            self._write_full(canvas, frame)
+        self._shadows[self._back] = frame.copy()
+
+    def _write_full(self, canvas, frame):
+        self.full_writes += 1
+        self.pixels_written += frame.shape[0] * frame.shape[1]
+        if self.bulk:
+            try:
+                # unsafe=False keeps the binding off PIL's raw buffer pointers, which is what segfaulted.
+                # It is not a bulk copy: the binding loops over SetPixel itself, only the loop leaves Python
+                canvas.SetImage(Image.fromarray(frame), 0, 0, unsafe=False)
+                return
+            except Exception as e:
+                print(f"SetImage unavailable, falling back to SetPixel rows: {e}")
+                self.bulk = False
+
+        set_pixel = canvas.SetPixel
+        width = frame.shape[1]
+        for y, row in enumerate(frame.reshape(frame.shape[0], -1).tolist()):
+            channels = iter(row)
+            for x, r, g, b in zip(range(width), channels, channels, channels):
+                set_pixel(x, y, r, g, b)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Render command queue
+Request threads never touch the display state or the hardware themselves;
+they post a command and return. Commands go into named slots, latest wins:
+posting a new image while another is still queued replaces it, so a burst
+of requests costs the render thread one update. The render thread takes all
+pending commands at once, in the order their slots were last written, and
+blocks on wait() with no polling while there is nothing to do. Every wait in
+playback goes through wait() or is woken by on_put, so a new command is
+picked up right away instead of after the current frame or slide.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class Ticket:
+    """Outcome of a queued command, for the few callers that need it (hardware re-init)"""
+    def __init__(self):
+        self.result = None
+        self._done = threading.Event()
+
+    def resolve(self, result):
+        self.result = result
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """The command's result, or None if it wasn't applied within timeout"""
+        return self.result if self._done.wait(timeout) else None
+
+
+class CommandQueue:
+    def __init__(self, on_put=None):
+        self.submitted = 0
+        self.coalesced = 0  # Commands replaced by a newer one before the render thread got to them
+        self.on_put = on_put  # Called after each put, to wake waits that can't use wait() (decoder queue)
+        self._pending = OrderedDict()  # slot -> (args, tickets, posted)
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, slot, args=None, ticket=False):
+        """Queue args for slot, replacing what is pending there; returns a Ticket if asked for one"""
+        result = Ticket() if ticket else None
+        with self._cond:
+            self.submitted += 1
+            previous = self._pending.pop(slot, None)
+            tickets = []
+            posted = time.monotonic()
+            if previous is not None:
+                self.coalesced += 1
+                # Resolved together with the command that replaced theirs; latency counts from the first post
+                _, tickets, posted = previous
+            if result:
+                tickets.append(result)
+            self._pending[slot] = (args, tickets, posted)
+            self._cond.notify_all()
+        if self.on_put:
+            self.on_put()
+        return result
+
+    def take(self, slots=None):
+        """All pending commands (or those for slots) as (slot, args, tickets, posted), oldest slot first;
+        posted is the time.monotonic() of the first post the command replaced"""
+        with self._cond:
+            items = [(slot, args, tickets, posted) for slot, (args, tickets, posted) in self._pending.items()
+                     if slots is None or slot in slots]
+            for slot, _, _, _ in items:
+                del self._pending[slot]
+        return items
+
+    def pending(self, slot=None):
+        """True if any command (or one for slot) is waiting"""
+        return bool(self._pending) if slot is None else slot in self._pending
+
+    def wait(self, timeout=None):
+        """Block until a command is queued or timeout passes; True if one is pending"""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            return bool(self._pending)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Render pipeline instrumentation
+Lightweight timing histograms and counters recorded by MatrixController
+(decode, resize, compose, blit, swap, matrix_lock wait, command-to-frame
+latency) and rendered in the Prometheus text exposition format. Recording a
+sample is a bisect and two additions under a lock, cheap enough to leave on
+in production.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers a sub-100us blit up to a multi-second stall
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+STAGES = ('decode', 'resize', 'compose', 'blit', 'swap')
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class TimedLock:
+    """Wraps a lock and records how long each acquire waited"""
+    def __init__(self, lock, histogram):
+        self._lock = lock
+        self._histogram = histogram
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._histogram.observe(time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class RenderMetrics:
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.lock_wait = Histogram()
+        self.command_latency = Histogram()  # Display command posted -> first frame showing its result
+        self.frames_shown = 0
+        self.frames_dropped = 0
+        self._counter_lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    def timed(self, stage):
+        return _StageTimer(self.stages[stage])
+
+    def frame_shown(self):
+        with self._counter_lock:
+            self.frames_shown += 1
+
+    def frame_dropped(self, count=1):
+        with self._counter_lock:
+            self.frames_dropped += count
+
+    def render(self, gauges=None, mode=None, counters=None):
+        """Prometheus text format; gauges and counters map (name, labels) -> value"""
+        lines = []
+        lines.append("# HELP led_render_stage_seconds Time spent in each render stage")
+        lines.append("# TYPE led_render_stage_seconds histogram")
+        for stage, histogram in self.stages.items():
+            lines.extend(_histogram_lines('led_render_stage_seconds', histogram, f'stage="{stage}"'))
+
+        lines.append("# HELP led_matrix_lock_wait_seconds Time spent waiting to acquire matrix_lock")
+        lines.append("# TYPE led_matrix_lock_wait_seconds histogram")
+        lines.extend(_histogram_lines('led_matrix_lock_wait_seconds', self.lock_wait, ''))
+
+        lines.append("# HELP led_command_latency_seconds Time from a display command being posted to its first frame")
+        lines.append("# TYPE led_command_latency_seconds histogram")
+        lines.extend(_histogram_lines('led_command_latency_seconds', self.command_latency, ''))
+
+        lines.append("# HELP led_frames_shown_total Frames swapped onto the panels")
+        lines.append("# TYPE led_frames_shown_total counter")
+        lines.append(f"led_frames_shown_total {self.frames_shown}")
+        lines.append("# HELP led_frames_dropped_total Frames skipped to keep playback on schedule")
+        lines.append("# TYPE led_frames_dropped_total counter")
+        lines.append(f"led_frames_dropped_total {self.frames_dropped}")
+
+        lines.extend(_sample_lines(counters, 'counter'))
+        lines.extend(_sample_lines(gauges, 'gauge'))
+
+        if mode is not None:
+            lines.append("# HELP led_mode Current display mode")
+            lines.append("# TYPE led_mode gauge")
+            lines.append(f'led_mode{{mode="{mode}"}} 1')
+        return '\n'.join(lines) + '\n'
+
+
+class _StageTimer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+def _sample_lines(samples, kind):
+    lines = []
+    declared = set()
+    for (name, labels), value in sorted((samples or {}).items()):
+        if name not in declared:
+            lines.append(f"# TYPE {name} {kind}")
+            declared.add(name)
+        label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+
+def _histogram_lines(name, histogram, labels):
+    counts, total, count = histogram.snapshot()
+    prefix = f'{labels},' if labels else ''
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(histogram.buckets, counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    cumulative += counts[-1]
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f'{name}_sum{suffix} {total}')
+    lines.append(f'{name}_count{suffix} {count}')
+    return lines
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
 """
 Raspberry Pi LED Matrix Controller v2.2
-Polls the web interface API and displays content on dual 64x64 LED matrices
+Follows the web interface API and displays content on dual 64x64 LED matrices
 Supports:
 - Draw mode (real-time drawing, overrides uploads)
 - Upload mode (GIF/PNG/Video files with animation)
+- Push updates: subscribes to the server's event stream and fetches only when
+  something changed, polling on fixed intervals while the stream is down
+- Binary draw state: only the pixels changed since the last sequence number
+  (or raw RGB with an ETag), over one keep-alive session, so an unchanged
+  display costs a 304 and a stroke a few bytes (JSON is still read from older
+  servers)
 Matrix configuration: Two 64x64 panels daisy-chained via GPIO
 """
 
+import os
 import time
+import threading
 import requests
 import sys
 import hashlib
@@ -16,14 +24,99 @@ import json
 from pathlib import Path
 from PIL import Image, ImageSequence
 from io import BytesIO
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
+
+try:
+    if "--no-hardware" in sys.argv or "-s" in sys.argv:
+        raise ImportError("Simulation mode forced")
+    from rgbmatrix import RGBMatrix, RGBMatrixOptions
+except ImportError:
+    # Headless runs (CI, benchmarks) render into the NumPy-backed virtual matrix
+    from virtual_matrix import RGBMatrix, RGBMatrixOptions
+    print("Warning: rgbmatrix library not available. Running in simulation mode (virtual matrix).")
+
+from asset_cache import AssetCache, FRAME_SIZE
+from frame_scheduler import FrameScheduler
 
 # Configuration
-API_URL = "http://45.80.148.216:8000/api/display"
-API_LATEST = "http://45.80.148.216:8000/api/latest"
-API_FILE = "http://45.80.148.216:8000/api/processed/"
-POLL_DRAW_INTERVAL = 0.5  # Check draw API every 500ms (reduced from 200ms)
-POLL_LATEST_INTERVAL = 5.0  # Check for new uploads every 5 seconds (reduced from 3s)
+API_BASE = os.environ.get('LED_API_BASE', "http://45.80.148.216:8000")  # e.g. http://localhost:8000 for api_standin.py
+API_URL = API_BASE + "/api/display"
+API_DISPLAY_RGB = API_BASE + "/api/display.rgb"  # 128x64 raw RGB, row-major (panel A is x 0-63), with an ETag
+API_DISPLAY_DELTA = API_BASE + "/api/display.delta"  # Pixels changed since a sequence number, or a snapshot
+API_LATEST = API_BASE + "/api/latest"
+API_FILE = API_BASE + "/api/processed/"
+API_EVENTS = API_BASE + "/api/events"  # Server-sent events: "display" and "latest" when they change
+POLL_DRAW_INTERVAL = 0.5  # Check draw API every 500ms (reduced from 200ms), only while push is down
+POLL_LATEST_INTERVAL = 5.0  # Check for new uploads every 5 seconds (reduced from 3s), only while push is down
+EVENTS_READ_TIMEOUT = 45.0  # The server sends a keep-alive every 15s; silence this long means the stream is dead
+EVENTS_RETRY_INTERVAL = 30.0  # Seconds between attempts to (re)subscribe while polling
+# Downloaded uploads and their decoded frames, kept across restarts
+ASSET_CACHE_DIR = os.environ.get('LED_CACHE_DIR', str(Path(__file__).resolve().parent / 'cache'))
+ASSET_CACHE_MB = int(os.environ.get('LED_CACHE_MB', 64))
+
+
+class EndpointMissing(Exception):
+    """The server answered 404: it predates this API"""
+
+
+class PushSubscriber(threading.Thread):
+    """Listens to API_EVENTS and collects the names of events that arrived.
+    While it isn't connected (server without push support, network down) the
+    main loop polls; every (re)connect reports both events, since anything may
+    have changed in the meantime."""
+    def __init__(self, url):
+        super().__init__(daemon=True)
+        self.url = url
+        self.connected = False
+        self._pending = set()
+        self._cond = threading.Condition()
+
+    def wait(self, timeout=None):
+        """Block until an event arrives or timeout passes; returns the events received since the last call"""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, set()
+        return pending
+
+    def _notify(self, *names):
+        with self._cond:
+            self._pending.update(names)
+            self._cond.notify_all()
+
+    def run(self):
+        while True:
+            try:
+                self._listen()
+            except (requests.RequestException, ValueError) as e:
+                if self.connected:
+                    print(f"Push channel dropped ({e})")
+            if self.connected:
+                print("Falling back to polling")
+                self.connected = False
+                self._notify('disconnected')  # Wake the main loop so it starts polling right away
+            time.sleep(EVENTS_RETRY_INTERVAL)
+
+    def _listen(self):
+        with requests.get(self.url, stream=True, timeout=(5, EVENTS_READ_TIMEOUT),
+                          headers={'Accept': 'text/event-stream'}) as response:
+            if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                return  # No push support on this server
+            self.connected = True
+            print("✓ Subscribed to push updates")
+            self._notify('display', 'latest')
+            event, has_data = 'message', False
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith(':'):
+                    continue  # Keep-alive comment
+                if not line:
+                    # A blank line ends an event
+                    if has_data:
+                        self._notify(event)
+                    event, has_data = 'message', False
+                elif line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    has_data = True
 
 class DualMatrixController:
     def __init__(self):
@@ -49,7 +142,8 @@ class DualMatrixController:
         self.gif_frames_b = []
         self.current_frame = 0
         self.frame_duration = 100  # milliseconds
-        self.last_frame_time = time.time()
+        self.frame_durations = []  # Per-frame durations of the current GIF (milliseconds)
+        self.scheduler = FrameScheduler()
         self.is_animated = False
         self.last_draw_check = 0
         self.last_displayed_data = None  # Cache to prevent redundant refreshes
@@ -57,6 +151,16 @@ class DualMatrixController:
         self.last_displayed_upload_timestamp = None  # Track what we last displayed for upload mode
         self.last_draw_content_hash = None  # Hash of the last draw content displayed
         self.last_upload_content_hash = None  # Hash of the last upload content displayed
+        self.subscriber = PushSubscriber(API_EVENTS)
+        self.assets = AssetCache(ASSET_CACHE_DIR, ASSET_CACHE_MB * 1024 * 1024)
+        self.session = requests.Session()  # Keep-alive: one connection for every API request
+        # Draw state APIs, most efficient first; ones the server doesn't have are dropped
+        self.display_apis = [(API_DISPLAY_DELTA, self._fetch_display_delta), (API_DISPLAY_RGB, self._fetch_display_rgb),
+                             (API_URL, self._fetch_display_json)]
+        self.display_seq = None  # Sequence number of the draw state in draw_pixels (delta API)
+        self.display_epoch = None  # Server instance that sequence number belongs to
+        self.draw_pixels = bytearray(128 * 64 * 3)  # Local copy of the draw state, deltas are applied to it
+        self.display_etag = None  # ETag of the last draw state fetched, sent back as If-None-Match
         
         print("=" * 60)
         print("Raspberry Pi LED Matrix Controller v2.2")
@@ -66,6 +170,7 @@ class DualMatrixController:
         print(f"Total resolution: {options.cols * options.chain_length}x{options.rows}")
         print(f"Draw API: {API_URL}")
         print(f"Upload API: {API_LATEST}")
+        print(f"Push updates: {API_EVENTS}")
         print("=" * 60)
         
         # Show startup test pattern
@@ -104,18 +209,11 @@ class DualMatrixController:
         if 0 <= x < 128 and 0 <= y < 64:
             self.matrix.SetPixel(x, y, int(r), int(g), int(b))
     
-    def display_matrices(self, matrix_a, matrix_b):
-        """Display both 64x64 matrices from API data"""
+    def display_frame(self, image):
+        """Display a 128x64 RGB image across both panels with one SetImage call"""
         try:
-            for y in range(64):
-                for x in range(64):
-                    rgb = matrix_a[y][x]
-                    self.set_pixel(x, y, rgb[0], rgb[1], rgb[2])
-            
-            for y in range(64):
-                for x in range(64):
-                    rgb = matrix_b[y][x]
-                    self.set_pixel(x + 64, y, rgb[0], rgb[1], rgb[2])
+            # unsafe=False: the default bulk path reads PIL's raw buffer pointers, which segfaulted
+            self.matrix.SetImage(image, 0, 0, unsafe=False)
         except Exception as e:
             print(f"Error displaying matrices: {e}")
     
@@ -132,36 +230,52 @@ class DualMatrixController:
         except:
             return None
     
-    def load_image_from_url(self, url):
-        """Download and load an image from URL"""
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                img = Image.open(BytesIO(response.content))
-                return img.convert('RGB')
-            return None
-        except Exception as e:
-            print(f"Error loading image from {url}: {e}")
-            return None
-    
-    def load_gif_frames(self, url):
-        """Download and extract all frames from a GIF"""
-        try:
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                img = Image.open(BytesIO(response.content))
-                frames = []
-                durations = []
-                
-                for frame in ImageSequence.Iterator(img):
-                    frames.append(frame.convert('RGB'))
-                    durations.append(frame.info.get('duration', 100))
-                
-                return frames, durations
+    def display_pixels(self, pixels):
+        """Paint (x, y, r, g, b) changes onto the panels in place"""
+        for x, y, r, g, b in pixels:
+            self.set_pixel(x, y, r, g, b)
+
+    def load_asset(self, filename, cached_only=False):
+        """Frames of an uploaded file at panel resolution and their durations (ms), or (None, None).
+        The asset cache answers when the server says the file is unchanged (304 on its ETag),
+        has the same content (servers without ETags) or can't be reached."""
+        cached = self.assets.validator(filename)
+        if not cached_only:
+            try:
+                headers = {'If-None-Match': cached} if cached else {}
+                response = self.session.get(API_FILE + filename, headers=headers, timeout=5)
+            except requests.RequestException as e:
+                print(f"Error loading {filename}: {e}")
+                cached_only = True
+        if cached_only or response.status_code == 304:
+            result = self.assets.load(filename)
+            return result if result else (None, None)
+        if response.status_code != 200:
             return None, None
+
+        content = response.content
+        result = self.assets.load(filename, digest=hashlib.sha256(content).hexdigest())
+        if result:
+            return result
+        try:
+            frames, durations = self.decode_frames(content)
         except Exception as e:
-            print(f"Error loading GIF from {url}: {e}")
+            print(f"Error decoding {filename}: {e}")
             return None, None
+        self.assets.store(filename, response.headers.get('ETag'), content, frames, durations)
+        return frames, durations
+
+    def decode_frames(self, content):
+        """All frames of an image or GIF, resized for one panel, with their durations (ms)"""
+        img = Image.open(BytesIO(content))
+        frames = []
+        durations = []
+        
+        for frame in ImageSequence.Iterator(img):
+            frames.append(frame.convert('RGB').resize(FRAME_SIZE))
+            durations.append(frame.info.get('duration', 100))
+        
+        return frames, durations
     
     def display_image(self, img_a, img_b):
         """Display two images side by side"""
@@ -185,20 +299,119 @@ class DualMatrixController:
         except Exception as e:
             print(f"Error displaying image: {e}")
     
-    def fetch_display_data(self):
-        """Fetch display data from the draw API"""
-        try:
-            response = requests.get(API_URL, timeout=1)
-            if response.status_code == 200:
-                return response.json()
+    def fetch_display_frame(self):
+        """Fetch the draw state as (128x64 image, last_updated, content hash, delta).
+        delta is (content hash it applies to, [(x, y, r, g, b), ...]) when only those pixels
+        changed, otherwise None. Returns None if the fetch failed or nothing changed."""
+        while True:
+            url, fetch = self.display_apis[0]
+            try:
+                return fetch()
+            except EndpointMissing:
+                self.display_apis.pop(0)
+                print(f"Server has no {url}, trying the next draw state API")
+            except (requests.RequestException, ValueError):
+                return None
+
+    def _fetch_display_delta(self):
+        """Changes since the last fetch from API_DISPLAY_DELTA, applied to the local copy"""
+        params = {}
+        if self.display_seq is not None:
+            params = {'since': self.display_seq, 'epoch': self.display_epoch}
+        response = self.session.get(API_DISPLAY_DELTA, params=params, timeout=1)
+        if response.status_code == 404:
+            raise EndpointMissing
+        if response.status_code != 200:
+            return None  # 304: nothing since our sequence number
+
+        kind = response.headers.get('X-Delta')
+        body = response.content
+        base_hash = f'{self.display_epoch}:{self.display_seq}'
+        pixels = self.draw_pixels
+        if kind == 'snapshot' and len(body) == len(pixels):
+            pixels[:] = body
+            delta = None
+        elif kind == 'pixels' and len(body) % 5 == 0:
+            changed = [tuple(body[i:i + 5]) for i in range(0, len(body), 5)]
+            for x, y, r, g, b in changed:
+                if x < 128 and y < 64:
+                    i = (y * 128 + x) * 3
+                    pixels[i:i + 3] = bytes((r, g, b))
+            delta = (base_hash, changed)
+        else:
             return None
-        except:
+        self.display_epoch = response.headers.get('X-Epoch')
+        self.display_seq = int(response.headers.get('X-Seq', 0))
+        image = Image.frombytes('RGB', (128, 64), bytes(pixels))
+        return image, response.headers.get('X-Last-Updated'), f'{self.display_epoch}:{self.display_seq}', delta
+
+    def _fetch_display_rgb(self):
+        """Whole frame from API_DISPLAY_RGB, revalidated with its ETag"""
+        headers = {'If-None-Match': self.display_etag} if self.display_etag else {}
+        response = self.session.get(API_DISPLAY_RGB, headers=headers, timeout=1)
+        if response.status_code == 404:
+            raise EndpointMissing
+        if response.status_code != 200 or len(response.content) != 128 * 64 * 3:
+            return None  # 304: unchanged, nothing decoded
+        # gzip/deflate transfer encoding is undone by requests
+        self.display_etag = response.headers.get('ETag')
+        image = Image.frombytes('RGB', (128, 64), response.content)
+        content_hash = self.display_etag or hashlib.md5(response.content).hexdigest()
+        return image, response.headers.get('X-Last-Updated'), content_hash, None
+
+    def _fetch_display_json(self):
+        """Whole frame from the JSON API_URL, the format every server has"""
+        response = self.session.get(API_URL, timeout=1)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        matrix_a = data.get('matrixA')
+        matrix_b = data.get('matrixB')
+        if not (matrix_a and matrix_b):
             return None
+        image = Image.new('RGB', (128, 64))
+        image.putdata([tuple(rgb) for y in range(64) for rgb in matrix_a[y][:64] + matrix_b[y][:64]])
+        return image, data.get('last_updated'), hashlib.md5(image.tobytes()).hexdigest(), None
+    
+    def show_upload(self, file_type, files, cached_only=False):
+        """Switch to upload mode showing files (panel A, panel B); returns True if they could be loaded"""
+        if len(files) < 2:
+            return False
+        self.current_mode = "upload"
+        self.is_animated = (file_type == 'gif')
+        
+        if file_type == 'gif':
+            print("Loading GIF frames...")
+            self.gif_frames_a, durations_a = self.load_asset(files[0], cached_only)
+            self.gif_frames_b, durations_b = self.load_asset(files[1], cached_only)
+            
+            if self.gif_frames_a and self.gif_frames_b:
+                self.frame_duration = durations_a[0] if durations_a else 100
+                self.frame_durations = durations_a or []
+                self.current_frame = 0
+                self.scheduler.reset()
+                print(f"✓ Loaded {len(self.gif_frames_a)} frames, {self.frame_duration}ms/frame")
+                return True
+            print("✗ Failed to load GIF frames")
+            self.current_mode = "idle"
+            return False
+        
+        # Static image - display once
+        print("Loading static images...")
+        frames_a, _ = self.load_asset(files[0], cached_only)
+        frames_b, _ = self.load_asset(files[1], cached_only)
+        
+        if frames_a and frames_b:
+            self.display_image(frames_a[0], frames_b[0])
+            print("✓ Static images displayed")
+            return True
+        print("✗ Failed to load images")
+        return False
     
     def fetch_latest_upload(self):
         """Fetch latest upload metadata"""
         try:
-            response = requests.get(API_LATEST, timeout=1)
+            response = self.session.get(API_LATEST, timeout=1)
             if response.status_code == 200:
                 return response.json()
             return None
@@ -214,58 +427,71 @@ class DualMatrixController:
         last_upload_check = time.time()
         last_draw_timestamp_str = None
         last_upload_timestamp_str = None
+        self.subscriber.start()
+        events = set()
+        
+        # Put the last upload back from the asset cache right away; anything newer comes from the server below
+        latest = self.assets.latest
+        if latest and self.show_upload(latest.get('type'), latest.get('files', []), cached_only=True):
+            print("✓ Restored the last upload from the asset cache")
+            last_upload_timestamp_str = latest.get('timestamp')
+            self.last_displayed_upload_timestamp = last_upload_timestamp_str
+            self.last_upload_content_hash = self.compute_content_hash(latest)
         
         try:
             while True:
                 current_time = time.time()
+                # Pushed events say what changed; without a push channel, poll on the intervals
+                polling = not self.subscriber.connected
                 
-                # Check draw API (every 500ms)
-                if current_time - self.last_draw_check >= POLL_DRAW_INTERVAL:
-                    data = self.fetch_display_data()
+                # Check draw API (on a "display" event, or every 500ms while polling)
+                if 'display' in events or (polling and current_time - self.last_draw_check >= POLL_DRAW_INTERVAL):
+                    frame = self.fetch_display_frame()
                     
-                    if data:
-                        draw_timestamp = data.get('last_updated')
-                        matrix_a = data.get('matrixA')
-                        matrix_b = data.get('matrixB')
+                    if frame:
+                        draw_image, draw_timestamp, content_hash, delta = frame
                         
-                        if matrix_a and matrix_b:
-                            # Compute hash of the actual pixel content
-                            content_hash = self.compute_content_hash({'a': matrix_a, 'b': matrix_b})
+                        # Only update if the actual content has changed
+                        if content_hash != self.last_draw_content_hash:
+                            # Compare timestamps to decide if draw should override upload
+                            should_display_draw = False
+                            
+                            if last_upload_timestamp_str is None:
+                                # No upload yet, display draw
+                                should_display_draw = True
+                            elif draw_timestamp and draw_timestamp > last_upload_timestamp_str:
+                                # Draw is newer than upload, display draw
+                                should_display_draw = True
+                            elif draw_timestamp == last_draw_timestamp_str:
+                                # Same timestamp but content changed (user continued drawing)
+                                should_display_draw = True
                             
-                            # Only update if the actual content has changed
-                            if content_hash and content_hash != self.last_draw_content_hash:
-                                # Compare timestamps to decide if draw should override upload
-                                should_display_draw = False
+                            if should_display_draw:
+                                # A delta can be painted over the panels only if they show the state it starts from
+                                in_place = (delta and self.current_mode == "draw"
+                                            and delta[0] == self.last_draw_content_hash)
                                 
-                                if last_upload_timestamp_str is None:
-                                    # No upload yet, display draw
-                                    should_display_draw = True
-                                elif draw_timestamp and draw_timestamp > last_upload_timestamp_str:
-                                    # Draw is newer than upload, display draw
-                                    should_display_draw = True
-                                elif draw_timestamp == last_draw_timestamp_str:
-                                    # Same timestamp but content changed (user continued drawing)
-                                    should_display_draw = True
+                                # Switch to draw mode and clear upload content
+                                if self.current_mode == "upload":
+                                    print("[SWITCHING] Upload → Draw mode")
+                                    self.gif_frames_a = []
+                                    self.gif_frames_b = []
                                 
-                                if should_display_draw:
-                                    # Switch to draw mode and clear upload content
-                                    if self.current_mode == "upload":
-                                        print("[SWITCHING] Upload → Draw mode")
-                                        self.gif_frames_a = []
-                                        self.gif_frames_b = []
-                                    
-                                    self.current_mode = "draw"
-                                    self.last_draw_time = current_time
-                                    print(f"[DRAW MODE] Updating display (new content detected)")
-                                    self.display_matrices(matrix_a, matrix_b)
-                                    last_draw_timestamp_str = draw_timestamp
-                                    self.last_displayed_draw_timestamp = draw_timestamp
-                                    self.last_draw_content_hash = content_hash
+                                self.current_mode = "draw"
+                                self.last_draw_time = current_time
+                                print(f"[DRAW MODE] Updating display (new content detected)")
+                                if in_place:
+                                    self.display_pixels(delta[1])
+                                else:
+                                    self.display_frame(draw_image)
+                                last_draw_timestamp_str = draw_timestamp
+                                self.last_displayed_draw_timestamp = draw_timestamp
+                                self.last_draw_content_hash = content_hash
                     
                     self.last_draw_check = current_time
                 
-                # Check for new uploads (every 5 seconds)
-                if current_time - last_upload_check >= POLL_LATEST_INTERVAL:
+                # Check for new uploads (on a "latest" event, or every 5 seconds while polling)
+                if 'latest' in events or (polling and current_time - last_upload_check >= POLL_LATEST_INTERVAL):
                     upload_data = self.fetch_latest_upload()
                     
                     if upload_data:
@@ -296,53 +522,41 @@ class DualMatrixController:
                                         print("[SWITCHING] Draw → Upload mode")
                                     
                                     print(f"\n[UPLOAD MODE] New {file_type} detected (new content)")
-                                    self.current_mode = "upload"
-                                    self.is_animated = (file_type == 'gif')
                                     last_upload_timestamp_str = upload_timestamp
                                     self.last_displayed_upload_timestamp = upload_timestamp
                                     self.last_upload_content_hash = upload_hash
-                                    
-                                    if file_type == 'gif':
-                                        print("Loading GIF frames...")
-                                        self.gif_frames_a, durations_a = self.load_gif_frames(API_FILE + files[0])
-                                        self.gif_frames_b, durations_b = self.load_gif_frames(API_FILE + files[1])
-                                        
-                                        if self.gif_frames_a and self.gif_frames_b:
-                                            self.frame_duration = durations_a[0] if durations_a else 100
-                                            self.current_frame = 0
-                                            print(f"✓ Loaded {len(self.gif_frames_a)} frames, {self.frame_duration}ms/frame")
-                                        else:
-                                            print("✗ Failed to load GIF frames")
-                                            self.current_mode = "idle"
-                                    else:
-                                        # Static image - display once
-                                        print("Loading static images...")
-                                        img_a = self.load_image_from_url(API_FILE + files[0])
-                                        img_b = self.load_image_from_url(API_FILE + files[1])
-                                        
-                                        if img_a and img_b:
-                                            self.display_image(img_a, img_b)
-                                            print("✓ Static images displayed")
-                                        else:
-                                            print("✗ Failed to load images")
+                                    if self.show_upload(file_type, files):
+                                        self.assets.remember_latest(upload_data)
                     
                     last_upload_check = current_time
                 
                 # Animate GIF if in upload mode
-                if self.current_mode == "upload" and self.is_animated and self.gif_frames_a and self.gif_frames_b:
-                    if current_time - self.last_frame_time >= (self.frame_duration / 1000.0):
+                animating = self.current_mode == "upload" and self.is_animated and self.gif_frames_a and self.gif_frames_b
+                if animating and self.scheduler.remaining() <= 0:
+                    frame_count = min(len(self.gif_frames_a), len(self.gif_frames_b))
+                    self.current_frame %= frame_count
+                    if self.current_frame < len(self.frame_durations):
+                        duration = self.frame_durations[self.current_frame]
+                    else:
+                        duration = self.frame_duration
+                    # Frames whose slot passed while polling are skipped, the schedule never drifts
+                    if self.scheduler.begin(duration / 1000.0):
                         self.display_image(
                             self.gif_frames_a[self.current_frame],
                             self.gif_frames_b[self.current_frame]
                         )
-                        self.current_frame = (self.current_frame + 1) % len(self.gif_frames_a)
-                        self.last_frame_time = current_time
+                    self.current_frame = (self.current_frame + 1) % frame_count
                 
-                # Adaptive sleep based on mode
-                if self.is_animated and self.current_mode == "upload":
-                    time.sleep(0.02)  # Fast loop for animations (20ms)
+                # Sleep until the next frame deadline or poll tick; pushed events wake it early
+                if animating:
+                    timeout = max(self.scheduler.remaining(), 0.0)
+                    if polling:
+                        timeout = min(timeout, 0.1)
+                elif polling:
+                    timeout = 0.1  # Slower for static/draw mode (100ms)
                 else:
-                    time.sleep(0.1)  # Slower for static/draw mode (100ms)
+                    timeout = None  # Idle: nothing to do until the server says something changed
+                events = self.subscriber.wait(timeout)
                 
         except KeyboardInterrupt:
             print("\n\nShutting down...")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Slideshow lookahead
+A worker thread prepares the next few slides while the current one is
+showing, so the slide boundary only has to pick up a finished result. What
+"prepared" means is up to the load callback (a composed still, a started
+video decoder, a warmed frame cache); results are held under a byte budget
+and handed over exactly once. Anything no longer wanted is released, calling
+its stop() when it has one.
+"""
+
+import threading
+
+
+class SlidePrefetcher(threading.Thread):
+    def __init__(self, load, budget_bytes, active=lambda: True):
+        super().__init__(daemon=True)
+        self.load = load  # key -> (result, nbytes)
+        self.budget_bytes = budget_bytes
+        self.active = active  # Held results are dropped once this turns False (slideshow stopped)
+        self.hits = 0
+        self.misses = 0
+        self._wanted = []
+        self._ready = {}  # key -> (result, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def want(self, keys):
+        """Prefetch these keys, in order; held results for other keys are released"""
+        with self._lock:
+            self._wanted = list(keys)
+            dropped = [key for key in self._ready if key not in self._wanted]
+            released = [self._pop(key) for key in dropped]
+        for result in released:
+            _release(result)
+        self._wake.set()
+
+    def take(self, key):
+        """The prepared result for key, or None if it isn't ready"""
+        with self._lock:
+            if key in self._wanted:
+                self._wanted.remove(key)
+            if key not in self._ready:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._pop(key)
+
+    def clear(self):
+        self.want([])
+
+    def _pop(self, key):
+        result, nbytes = self._ready.pop(key)
+        self._bytes -= nbytes
+        return result
+
+    def _next_key(self):
+        with self._lock:
+            if self._bytes >= self.budget_bytes:
+                return None
+            for key in self._wanted:
+                if key not in self._ready:
+                    return key
+        return None
+
+    def run(self):
+        while True:
+            self._wake.wait(1.0)
+            self._wake.clear()
+            if not self.active():
+                if self._ready or self._wanted:
+                    self.clear()
+                continue
+
+            key = self._next_key()
+            while key is not None:
+                try:
+                    result, nbytes = self.load(key)
+                except Exception as e:
+                    print(f"Error prefetching {key[0]}: {e}")
+                    result, nbytes = None, 0
+                with self._lock:
+                    keep = key in self._wanted and key not in self._ready
+                    if keep:
+                        self._ready[key] = (result, nbytes)
+                        self._bytes += nbytes
+                if not keep:
+                    _release(result)
+                key = self._next_key()
+
+
+def _release(result):
+    stop = getattr(result, 'stop', None)
+    if stop is not None:
+        stop()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Uploads that can be read while they are still arriving
+The request handler appends chunks to the file on disk through UploadStream;
+players open a StreamReader on it, a file-like object whose reads wait for
+more data instead of hitting EOF until the upload has finished. PIL can then
+decode a GIF frame by frame as its bytes come in, with only the current frame
+in memory however large the file is.
+"""
+
+import hashlib
+import os
+import threading
+
+CHUNK_SIZE = 64 * 1024
+SHORT_READ = 4096  # Reads up to this size wait for all bytes (header fields), larger ones return what is there
+
+
+class UploadStream:
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.complete = False
+        self.failed = False
+        self.final_path = None  # Where the finished upload was moved to, once it is there
+        self._hash = hashlib.sha256()  # Content digest, computed as the bytes arrive
+        self._file = open(path, 'wb')
+        self._cond = threading.Condition()
+        self._wakes = 0  # Bumped by wake(), so one that comes while should_stop runs isn't missed
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self._file.flush()  # Readers use their own handle, the bytes must be in the file
+        with self._cond:
+            self.size += len(chunk)
+            self._cond.notify_all()
+
+    def finish(self):
+        self._file.close()
+        with self._cond:
+            self.complete = True
+            self._cond.notify_all()
+
+    def moved(self, path):
+        """Record that the finished file now lives at path (path itself is gone)"""
+        self.final_path = path
+
+    def fail(self):
+        self._file.close()
+        with self._cond:
+            self.failed = True
+            self._cond.notify_all()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def wake(self):
+        """Make waiting readers re-check their should_stop"""
+        with self._cond:
+            self._wakes += 1
+            self._cond.notify_all()
+
+    @property
+    def digest(self):
+        return self._hash.hexdigest()
+
+    def open_reader(self, should_stop=lambda: False):
+        return StreamReader(self, should_stop)
+
+    def _wait_for(self, end, should_stop):
+        """Wait until the file holds end bytes or the upload ended; returns the available size"""
+        with self._cond:
+            while self.size < end and not (self.complete or self.failed):
+                wakes = self._wakes
+                # should_stop may do real work (the player applies settings commands there): not under the lock
+                self._cond.release()
+                try:
+                    stop = should_stop()
+                finally:
+                    self._cond.acquire()
+                if stop:
+                    break
+                if self._wakes == wakes and self.size < end and not (self.complete or self.failed):
+                    # Woken by write, finish, fail or wake(), no polling
+                    self._cond.wait()
+            return self.size
+
+
+class StreamReader:
+    """Read-only, seekable view of an UploadStream that blocks at the write edge"""
+    def __init__(self, stream, should_stop):
+        self._stream = stream
+        self._should_stop = should_stop  # Checked while waiting; a stopped reader sees EOF
+        self._file = open(stream.path, 'rb')
+        self._pos = 0
+
+    def read(self, size=-1):
+        stream = self._stream
+        if size is None or size < 0:
+            stream._wait_for(float('inf'), self._should_stop)
+            available = stream.size
+        else:
+            available = stream._wait_for(self._pos + min(size, SHORT_READ), self._should_stop)
+            if available < self._pos + size:
+                available = stream._wait_for(self._pos + 1, self._should_stop)
+        if stream.failed or self._should_stop():
+            return b''
+        count = max(0, available - self._pos)
+        if size is not None and size >= 0:
+            count = min(count, size)
+        self._file.seek(self._pos)
+        data = self._file.read(count)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            # The end is only known once the upload is done
+            self._stream._wait_for(float('inf'), self._should_stop)
+            offset += self._stream.size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Threaded MP4 decode pipeline
+A producer thread reads frames with OpenCV, resizes them straight to panel
+resolution (INTER_AREA), composes them for the layout mode and panel
+rotations/mirrors, and queues them in a bounded buffer. The render thread
+only takes finished frames off the buffer and blits them.
+GifDecoder does the same for GIFs too large to keep decoded in the frame
+cache, so memory stays at the buffer plus PIL's current frame.
+"""
+
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from panel_compositor import PanelCompositor
+
+_END = object()  # Queued by the producer after the last frame
+_WAKE = object()  # Queued by interrupt() to end a waiting get() early
+
+
+class VideoDecoder(threading.Thread):
+    def __init__(self, path, mode, rotations, mirrors, loop=True, capacity=8, start_frame=0, metrics=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.mode = mode
+        self.rotations = list(rotations)
+        self.mirrors = list(mirrors)
+        self.loop = loop
+        self.start_frame = start_frame
+        self.metrics = metrics  # Optional RenderMetrics for per-stage timings
+        self.buffer = queue.Queue(maxsize=capacity)
+        self.compositor = PanelCompositor()  # Own instance, the gather map is not shared across threads
+        self.fps = 30.0
+        self.duration = 1.0 / self.fps  # Display time of the frame get() returned last
+        self.ok = False
+        self.finished = False
+        self.opened = threading.Event()
+
+        # Stats
+        self.decoded = 0
+        self.shown = 0
+        self.dropped = 0
+        self.underruns = 0
+        self.position = start_frame  # Index of the next frame handed to the render thread
+        self.decode_seconds = 0.0
+        self.frame_count = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.path)
+        try:
+            if not cap.isOpened():
+                print(f"Failed to open video: {self.path}")
+                return
+
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.fps = fps if fps > 0 else 30.0
+            self.duration = 1.0 / self.fps
+            self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if self.start_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame % max(self.frame_count, 1))
+            self.ok = True
+            self.opened.set()
+
+            frames_this_pass = 0
+            while not self._stop_event.is_set():
+                started = time.perf_counter()
+                ret, bgr = cap.read()
+                if self.metrics:
+                    self.metrics.observe('decode', time.perf_counter() - started)
+                if not ret:
+                    # Stop on a pass that yields nothing, otherwise a broken file spins forever
+                    if self.loop and (frames_this_pass or self.start_frame):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        frames_this_pass = 0
+                        self.start_frame = 0
+                        continue
+                    break
+
+                frame = self._prepare(bgr)
+                self.decode_seconds += time.perf_counter() - started
+                self.decoded += 1
+                frames_this_pass += 1
+                if not self._put(frame):
+                    break
+        except Exception as e:
+            print(f"Error decoding {self.path}: {e}")
+        finally:
+            cap.release()
+            self.opened.set()
+            self._put(_END)
+
+    def _prepare(self, bgr):
+        """Resize to panel resolution and lay the frame out on the 128x64 canvas"""
+        started = time.perf_counter()
+        layout = self._layout(bgr)
+        resized = time.perf_counter()
+        frame = self.compositor.compose(layout, self.rotations, self.mirrors)
+        if self.metrics:
+            self.metrics.observe('resize', resized - started)
+            self.metrics.observe('compose', time.perf_counter() - resized)
+        return frame
+
+    def _layout(self, bgr):
+        if self.mode == 'split':
+            small = cv2.resize(bgr, (128, 64), interpolation=cv2.INTER_AREA)
+            # Reversed channel view: the compositor gather performs the BGR -> RGB swap while copying
+            layout = small[..., ::-1]
+        else:
+            small = cv2.resize(bgr, (64, 64), interpolation=cv2.INTER_AREA)
+            rgb = small[..., ::-1]
+            layout = np.zeros((64, 128, 3), dtype=np.uint8)
+            if self.mode == 'clone':
+                layout[:, :64] = rgb
+                layout[:, 64:] = rgb
+            elif self.mode == 'matrix_a':
+                layout[:, :64] = rgb
+            elif self.mode == 'matrix_b':
+                layout[:, 64:] = rgb
+        return layout
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self.buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, timeout=1.0):
+        """Next composed frame, or None on underrun, interrupt() or end of stream"""
+        if self.finished:
+            return None
+        try:
+            item = self.buffer.get(timeout=timeout)
+        except queue.Empty:
+            self.underruns += 1
+            return None
+        if item is _END:
+            self.finished = True
+            return None
+        if item is _WAKE:
+            return None
+        self.position += 1
+        return item
+
+    def interrupt(self):
+        """Wake a get() that is waiting on an empty buffer (a new command for the render thread)"""
+        try:
+            self.buffer.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # get() won't wait while frames are buffered
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1.0)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'fps': self.fps,
+            'decoded': self.decoded,
+            'shown': self.shown,
+            'dropped': self.dropped,
+            'underruns': self.underruns,
+            'decode_fps': self.decoded / self.decode_seconds if self.decode_seconds else 0.0,
+            'buffered': self.buffer.qsize(),
+        }
+
+
+class GifDecoder(VideoDecoder):
+    """Streams a GIF through the same bounded buffer, with each frame's own duration.
+    Frames are decoded strictly in order: PIL builds each one on top of the previous
+    according to its disposal method, so skipping ahead would show the wrong pixels.
+    At the end of a pass it rewinds the open file, which costs one frame decode."""
+    def run(self):
+        gif = None
+        try:
+            gif = Image.open(self.path)
+            self.frame_count = getattr(gif, 'n_frames', 1)
+            if self.start_frame:
+                gif.seek(self.start_frame % self.frame_count)
+            self.fps = 1000.0 / (gif.info.get('duration') or 100)
+            self.ok = True
+            self.opened.set()
+
+            while not self._stop_event.is_set():
+                started = time.perf_counter()
+                rgb = gif.convert('RGB')
+                if self.metrics:
+                    self.metrics.observe('decode', time.perf_counter() - started)
+                frame = self._prepare(rgb)
+                del rgb
+                self.decode_seconds += time.perf_counter() - started
+                self.decoded += 1
+                if not self._put((frame, gif.info.get('duration', 100) / 1000.0)):
+                    break
+                try:
+                    gif.seek(gif.tell() + 1)
+                except EOFError:
+                    if not self.loop:
+                        break
+                    gif.seek(0)
+        except Exception as e:
+            print(f"Error decoding {self.path}: {e}")
+        finally:
+            if gif is not None:
+                gif.close()
+            self.opened.set()
+            self._put(_END)
+
+    def _layout(self, rgb):
+        """Same resize and placement as MatrixController._render_layout"""
+        if self.mode == 'split':
+            return np.asarray(rgb.resize((128, 64)))
+        small = np.asarray(rgb.resize((64, 64)))
+        layout = np.zeros((64, 128, 3), dtype=np.uint8)
+        if self.mode == 'clone':
+            layout[:, :64] = small
+            layout[:, 64:] = small
+        elif self.mode == 'matrix_a':
+            layout[:, :64] = small
+        elif self.mode == 'matrix_b':
+            layout[:, 64:] = small
+        return layout
+
+    def get(self, timeout=1.0):
+        item = super().get(timeout)
+        if item is None:
+            return None
+        frame, self.duration = item
+        return frame
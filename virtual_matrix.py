@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Virtual rgbmatrix backend
+Drop-in stand-in for rgbmatrix.RGBMatrix/RGBMatrixOptions backed by NumPy
+buffers, used in simulation mode so the full render path runs headless.
+Per-call costs can be emulated and swapped frames are recorded with their
+timestamps for benchmarks and inspection. SetImage(unsafe=False) loops over
+SetPixel like the real binding does; the binding runs that loop in Cython,
+so the cost here is an upper bound.
+"""
+
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+
+def _spend(seconds):
+    """Busy-wait, sleep() is far too coarse for per-call costs in the microsecond range"""
+    if seconds <= 0:
+        return
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class RGBMatrixOptions:
+    def __init__(self):
+        self.rows = 32
+        self.cols = 32
+        self.chain_length = 1
+        self.parallel = 1
+        self.hardware_mapping = 'regular'
+        self.gpio_slowdown = 1
+        self.brightness = 100
+        self.pwm_lsb_nanoseconds = 130
+        self.disable_hardware_pulsing = False
+        self.scan_mode = 0
+        self.multiplexing = 0
+        self.row_address_type = 0
+        self.pwm_bits = 11
+        self.limit_refresh_rate_hz = 0
+
+        # Virtual-only: emulated cost of each call in seconds, and how many swapped frames to keep
+        self.set_pixel_cost = 0.0
+        self.set_image_cost = 0.0
+        self.fill_cost = 0.0
+        self.swap_cost = 0.0
+        self.record_frames = 120
+
+
+class FrameCanvas:
+    def __init__(self, matrix):
+        self._matrix = matrix
+        self.width = matrix.width
+        self.height = matrix.height
+        # SetPixel writes the bytearray directly (much cheaper than NumPy item assignment), buffer views it
+        self._bytes = bytearray(self.width * self.height * 3)
+        self.buffer = np.frombuffer(self._bytes, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def SetPixel(self, x, y, r, g, b):
+        matrix = self._matrix
+        matrix.stats['set_pixel'] += 1
+        if matrix.options.set_pixel_cost:
+            _spend(matrix.options.set_pixel_cost)
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = (y * self.width + x) * 3
+            data = self._bytes
+            data[i] = r
+            data[i + 1] = g
+            data[i + 2] = b
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        if image.mode != "RGB":
+            raise Exception("Currently, only RGB mode is supported for SetImage(). Please create images with mode 'RGB' or convert first with image = image.convert('RGB'). Pull requests to support more modes natively are also welcome :)")
+        self._matrix.stats['set_image'] += 1
+        if not unsafe:
+            # What the binding does without unsafe: image.load() and one SetPixel per pixel, column by column.
+            # Only unsafe=True is a bulk copy there
+            pixels = image.load()
+            width, height = image.size
+            for x in range(max(0, -offset_x), min(width, self.width - offset_x)):
+                for y in range(max(0, -offset_y), min(height, self.height - offset_y)):
+                    r, g, b = pixels[x, y]
+                    self.SetPixel(x + offset_x, y + offset_y, r, g, b)
+            return
+        _spend(self._matrix.options.set_image_cost)
+
+        pixels = np.asarray(image)
+        x0, y0 = max(offset_x, 0), max(offset_y, 0)
+        x1 = min(offset_x + pixels.shape[1], self.width)
+        y1 = min(offset_y + pixels.shape[0], self.height)
+        if x0 < x1 and y0 < y1:
+            self.buffer[y0:y1, x0:x1] = pixels[y0 - offset_y:y1 - offset_y, x0 - offset_x:x1 - offset_x]
+
+    def Fill(self, r, g, b):
+        self._matrix.stats['fill'] += 1
+        _spend(self._matrix.options.fill_cost)
+        self.buffer[:] = (r, g, b)
+
+    def Clear(self):
+        self.Fill(0, 0, 0)
+
+
+class RGBMatrix:
+    def __init__(self, options=None):
+        self.options = options or RGBMatrixOptions()
+        for name, default in vars(RGBMatrixOptions()).items():
+            if not hasattr(self.options, name):
+                setattr(self.options, name, default)
+        self.width = self.options.cols * self.options.chain_length
+        self.height = self.options.rows * self.options.parallel
+        self.brightness = self.options.brightness
+        self.stats = {'set_pixel': 0, 'set_image': 0, 'fill': 0, 'swaps': 0}
+        self.frames = deque(maxlen=max(self.options.record_frames, 1))  # (monotonic timestamp, frame)
+        self._front = FrameCanvas(self)
+        self._swap_lock = threading.Lock()
+
+    def CreateFrameCanvas(self):
+        return FrameCanvas(self)
+
+    def SwapOnVSync(self, new_frame, framerate_fraction=1):
+        if self.options.swap_cost:
+            # The real call blocks on the refresh thread without burning CPU
+            time.sleep(self.options.swap_cost * framerate_fraction)
+        with self._swap_lock:
+            previous, self._front = self._front, new_frame
+            self.stats['swaps'] += 1
+            if self.options.record_frames:
+                self.frames.append((time.monotonic(), new_frame.buffer.copy()))
+        return previous
+
+    # Direct drawing on the displayed canvas, as the real matrix allows
+    def SetPixel(self, x, y, r, g, b):
+        self._front.SetPixel(x, y, r, g, b)
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        self._front.SetImage(image, offset_x, offset_y, unsafe)
+
+    def Fill(self, r, g, b):
+        self._front.Fill(r, g, b)
+
+    def Clear(self):
+        self._front.Clear()
+
+    def display(self):
+        """Copy of what the panels currently show"""
+        return self._front.buffer.copy()
@@ -1,20 +1,36 @@
 #!/usr/bin/env python3
 import os
 import sys
+import tempfile
 import time
 import threading
-import cv2
 from flask import Flask, render_template, request, redirect, url_for, jsonify
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from PIL import Image
 import numpy as np
 
 import json
+from io import BytesIO
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_file, Response
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 
+from panel_compositor import PanelCompositor
+from frame_cache import FrameCache, IndexedFrame, frame_cache_key
+from video_pipeline import VideoDecoder, GifDecoder
+from frame_scheduler import FrameScheduler
+import draw_ops
+import media_transcode
+from media_jobs import MediaJobs, JobQueueFull
+from media_index import MediaIndex
+from media_store import MediaStore, save_hashed, hash_file
+from slide_prefetch import SlidePrefetcher
+from upload_stream import UploadStream, CHUNK_SIZE
+from render_metrics import RenderMetrics, TimedLock
+from render_commands import CommandQueue
+
 # Check for simulation mode
 FORCE_SIMULATION = "--no-hardware" in sys.argv or "-s" in sys.argv
 
@@ -24,10 +40,16 @@ try:
     from rgbmatrix import RGBMatrix, RGBMatrixOptions
     GPIO_AVAILABLE = True
 except ImportError:
+    # Simulation mode renders into the NumPy-backed virtual matrix so the whole pipeline still runs
+    from virtual_matrix import RGBMatrix, RGBMatrixOptions
     GPIO_AVAILABLE = False
-    print("Warning: rgbmatrix library not available. Running in simulation mode.")
+    print("Warning: rgbmatrix library not available. Running in simulation mode (virtual matrix).")
+
+MATRIX_AVAILABLE = True  # Cleared if the matrix can't be initialized on startup
 
-app = Flask(__name__, template_folder='web/templates', static_folder='web/static')
+# LED_INSTANCE_PATH (absolute) moves media.db and the blobs elsewhere, e.g. for bench_render.py
+app = Flask(__name__, template_folder='web/templates', static_folder='web/static',
+            instance_path=os.environ.get('LED_INSTANCE_PATH'))
 app.config['UPLOAD_FOLDER'] = 'web/static/live_cache'
 app.config['SD_CARD_FOLDER'] = 'web/static/sd_card'
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max upload
@@ -95,15 +117,33 @@ class User(UserMixin):
 def load_user(user_id):
     return User.get(user_id)
 
-# Ensure directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['SD_CARD_FOLDER'], exist_ok=True)
+MAX_PAGE_SIZE = 500
+HARDWARE_TIMEOUT = 10  # Seconds /settings waits for the render thread to re-init the matrix
+SETTINGS_SLOTS = ('rotations', 'mirrors', 'hardware')  # Commands that change how content shows, not what
+
+def receive_upload(file, folder):
+    """Save an uploaded file to a temporary name in folder, hashing it on the way; returns (path, digest)"""
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+    os.close(fd)
+    try:
+        return tmp, save_hashed(file.stream, tmp)
+    except:
+        os.remove(tmp)
+        raise
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def media_mode(filepath):
+    """Layout mode from an SD card file's JSON sidecar"""
+    try:
+        with open(filepath + '.json', 'r') as f:
+            return json.load(f).get('mode', 'clone')
+    except:
+        return 'clone'
+
 def load_settings():
     try:
         with open('settings.json', 'r') as f:
@@ -113,7 +153,6 @@ def load_settings():
 
 class MatrixController:
     def __init__(self):
-        global GPIO_AVAILABLE
         self.matrix = None
         self.offscreen_canvas = None
         self.current_mode = "color" # color, image, video
@@ -127,8 +166,37 @@ class MatrixController:
         self.panel_rotations = [0, 0]
         self.panel_mirrors = [False, False]
         self.last_hw_settings = {}
+        self.compositor = PanelCompositor()
+        client_settings = load_settings().get('client', {})
+        # Uploads are decoded in worker processes, off the GIL the web UI and the render loop share
+        self.jobs = MediaJobs(client_settings.get('preprocess_workers'))
+        self.frame_cache = FrameCache(int(client_settings.get('frame_cache_mb', 64)) * 1024 * 1024)
+        # GIFs whose cached frames would exceed this are decoded while they play instead
+        self.gif_stream_bytes = int(client_settings.get('gif_stream_mb', 4)) * 1024 * 1024
+        # Next slides are decoded while the current one shows, within their own memory budget
+        self.prefetch_depth = int(client_settings.get('prefetch_slides', 2))
+        self.prefetcher = SlidePrefetcher(self._prepare_slide,
+                                          int(client_settings.get('prefetch_mb', 16)) * 1024 * 1024,
+                                          active=lambda: self.current_mode == "slideshow")
+        self.prefetcher.start()
+        self.video_stats = {}
+        # Request threads only post commands; the render thread owns the display state and the hardware
+        self.commands = CommandQueue(on_put=self._wake_playback)
+        self.content_serial = 0  # Bumped for every content command applied, so players know to stop
+        self.command_posted = None  # When the applied content command was posted, until its first frame shows
+        # Frame and slide waits end early when a command arrives
+        self.scheduler = FrameScheduler(sleep=self.commands.wait)
+        self.draw_buffer = draw_ops.new_buffer()  # Persistent draw mode framebuffer, survives mode switches
+        self.draw_dirty = False
+        self.draw_lock = threading.Lock()
         self.is_running = True
-        self.matrix_lock = threading.Lock()
+        self.metrics = RenderMetrics()
+        self.matrix_lock = TimedLock(threading.Lock(), self.metrics.lock_wait)
+        self.active_decoder = None
+        self.upload_stream = None  # GIF upload still arriving, played progressively until it completes
+        self.awaiting_upload = None  # Token of the newest live upload still being processed
+        self.transcoder = media_transcode.Transcoder(self.jobs.run)
+        self.transcoder.start()
         self.thread = threading.Thread(target=self._run_loop)
         self.thread.daemon = True
         
@@ -136,8 +204,8 @@ class MatrixController:
         self.thread.start()
 
     def init_matrix(self):
-        global GPIO_AVAILABLE
-        if GPIO_AVAILABLE:
+        global MATRIX_AVAILABLE
+        if MATRIX_AVAILABLE:
             settings = load_settings()
             hw_settings = settings.get('hardware', {})
             self.panel_rotations = settings.get('client', {}).get('panel_rotations', [0, 0])
@@ -173,6 +241,7 @@ class MatrixController:
 
                     self.matrix = RGBMatrix(options=options)
                     self.offscreen_canvas = self.matrix.CreateFrameCanvas()
+                    self.compositor.invalidate()
                     self.last_hw_settings = hw_settings
                     
                     # Restore current image if needed
@@ -185,343 +254,577 @@ class MatrixController:
                 # If this is the first init (self.matrix is None), we might want to disable GPIO
                 # But if it's a re-init, we should propagate error
                 if self.matrix is None and not hasattr(self, 'thread'): # Heuristic for first run
-                     GPIO_AVAILABLE = False
+                     MATRIX_AVAILABLE = False
                 return False
         return False
 
     def set_rotations(self, rotations):
-        with self.matrix_lock:
-            self.panel_rotations = rotations
-            # Force redraw if static image
-            if self.current_mode == "image" and self.current_image:
-                self._safe_set_image(self.offscreen_canvas, self.current_image)
-                self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
+        self.commands.put('rotations', list(rotations))
 
     def set_mirrors(self, mirrors):
+        self.commands.put('mirrors', list(mirrors))
+
+    def reinit_matrix(self):
+        """Re-read the hardware settings on the render thread; returns a Ticket with init_matrix's result"""
+        return self.commands.put('hardware', ticket=True)
+
+    def _apply_commands(self, slots=None):
+        """Apply everything request threads queued since the last call, or only the commands for slots
+        (render thread only). Returns True if the content changed, so whatever is playing should stop."""
+        serial = self.content_serial
+        for slot, args, tickets, posted in self.commands.take(slots):
+            result = None
+            try:
+                if slot == 'content':
+                    self.content_serial += 1
+                    self.command_posted = posted
+                    self._apply_content(*args)
+                elif slot == 'rotations':
+                    self.panel_rotations = args
+                    self._redraw()
+                elif slot == 'mirrors':
+                    self.panel_mirrors = args
+                    self._redraw()
+                elif slot == 'hardware':
+                    result = self.init_matrix()
+                    self._redraw()
+            except Exception as e:
+                print(f"Error applying {slot} command: {e}")
+            for ticket in tickets:
+                ticket.resolve(result)
+        return self.content_serial != serial
+
+    def _wake_playback(self):
+        """Cut short the waits that don't go through commands.wait (request threads, on every command)"""
+        decoder = self.active_decoder
+        if decoder:
+            decoder.interrupt()
+        stream = self.upload_stream
+        if stream:
+            stream.wake()
+
+    def _wait_frame(self):
+        """Sleep out the current frame's slot, applying commands as they arrive.
+        Returns True as soon as one of them changed the content."""
+        while self.scheduler.sleep():
+            if self._apply_commands():
+                return True
+        return False
+
+    def _apply_content(self, kind, *args):
+        if kind == 'color':
+            self.current_color = args[0]
+            self.current_mode = "color"
+        elif kind == 'image':
+            image_path, mode = args
+            self.current_image = self._process_image(image_path, mode)
+            self.current_mode = "image"
+        elif kind == 'video':
+            self.current_video_path, self.current_video_mode, self.upload_stream = args
+            self.current_mode = "video"
+        elif kind == 'slideshow':
+            self.prefetcher.clear()
+            self.slideshow_files, self.slide_duration = args
+            self.slideshow_index = 0
+            self.current_mode = "slideshow"
+        elif kind == 'draw':
+            self.current_mode = "draw"
+        self._redraw()
+
+    def _redraw(self):
+        """Put static content (color, image, draw buffer) on the panels after it or the layout changed"""
+        if self.current_mode == "draw":
+            with self.draw_lock:
+                self.draw_dirty = True
+            return
         with self.matrix_lock:
-            self.panel_mirrors = mirrors
-            # Force redraw if static image
-            if self.current_mode == "image" and self.current_image:
+            if not (self.matrix and self.offscreen_canvas):
+                return
+            if self.current_mode == "color":
+                self.offscreen_canvas.Fill(*self.current_color)
+                self.compositor.invalidate()
+                self._swap()
+            elif self.current_mode == "image" and self.current_image:
                 self._safe_set_image(self.offscreen_canvas, self.current_image)
-                self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
+                self._swap()
 
     def _apply_rotation(self, img, rotation):
         if rotation == 0: return img
         return img.rotate(-rotation, expand=False) # Negative for clockwise visual effect if needed, or just standard rotate
 
+    def _swap(self):
+        """Swap the offscreen canvas onto the panels (call with matrix_lock held)"""
+        with self.metrics.timed('swap'):
+            self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
+        self.compositor.swapped()
+        self.metrics.frame_shown()
+        if self.command_posted is not None:
+            self.metrics.command_latency.observe(time.monotonic() - self.command_posted)
+            self.command_posted = None
+
     def _safe_set_image(self, canvas, image, mode='split'):
-        """Safely set image on canvas by setting pixels manually to avoid segfaults"""
+        """Compose the image for the panel layout and push only the changed pixels to the canvas"""
         try:
-            # Ensure image is RGB
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Create a black canvas-sized image to compose onto
-            final_img = Image.new('RGB', (canvas.width, canvas.height), (0,0,0))
-            
-            # Split and rotate logic assuming 2x 64x64 panels side-by-side
-            # Panel 1: 0-64
-            # Panel 2: 64-128
-            
-            # Crop parts from source image
-            # If source is smaller, we center it? Or just paste?
-            # The source 'image' passed here is usually already resized/thumbnail to 128x64 in set_image
-            
-            # We need to handle the case where image is smaller than canvas
-            # But let's assume we work on the canvas coordinate space
-            
-            # Paste source onto a temp buffer of canvas size
-            temp_bg = Image.new('RGB', (canvas.width, canvas.height), (0,0,0))
-            temp_bg.paste(image, (0, 0)) # Assuming image is already positioned/sized or we just paste at 0,0
-            
-            # Process Panel 1
-            p1 = temp_bg.crop((0, 0, 64, 64))
-            if len(self.panel_rotations) > 0 and self.panel_rotations[0] != 0:
-                p1 = p1.rotate(-self.panel_rotations[0]) # PIL rotate is counter-clockwise, so negative for clockwise
-            if len(self.panel_mirrors) > 0 and self.panel_mirrors[0]:
-                p1 = p1.transpose(Image.FLIP_LEFT_RIGHT)
-            final_img.paste(p1, (0, 0))
-            
-            # Process Panel 2
-            if canvas.width >= 128:
-                p2 = temp_bg.crop((64, 0, 128, 64))
-                if len(self.panel_rotations) > 1 and self.panel_rotations[1] != 0:
-                    p2 = p2.rotate(-self.panel_rotations[1])
-                if len(self.panel_mirrors) > 1 and self.panel_mirrors[1]:
-                    p2 = p2.transpose(Image.FLIP_LEFT_RIGHT)
-                final_img.paste(p2, (64, 0))
-            
-            width, height = final_img.size
-            width = min(width, canvas.width)
-            height = min(height, canvas.height)
-            
-            # Use SetImage instead of manual pixel loop for performance
-            # Reverting to manual loop as SetImage caused SEGV
-            pixels = final_img.load()
-            for x in range(width):
-                for y in range(height):
-                    r, g, b = pixels[x, y]
-                    canvas.SetPixel(x, y, r, g, b)
+            with self.metrics.timed('compose'):
+                frame = self.compositor.to_array(image, canvas.width, canvas.height)
+                frame = self.compositor.compose(frame, self.panel_rotations, self.panel_mirrors)
+            with self.metrics.timed('blit'):
+                self.compositor.blit(canvas, frame)
         except Exception as e:
             print(f"Error in _safe_set_image: {e}")
 
     def _run_loop(self):
-        last_image_update = 0
         while self.is_running:
             try:
-                if not GPIO_AVAILABLE:
-                    time.sleep(1)
-                    continue
-                
-                with self.matrix_lock:
-                    if not self.matrix or not self.offscreen_canvas:
-                        time.sleep(0.1)
-                        continue
-
-                    if self.current_mode == "color":
-                        self.offscreen_canvas.Fill(self.current_color[0], self.current_color[1], self.current_color[2])
-                        self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
-                        time.sleep(0.1)
-                    
-                    elif self.current_mode == "image":
-                        # Only update if we haven't drawn this frame yet or if we need to refresh
-                        # Actually, SwapOnVSync swaps buffers, so we need to draw to the new back buffer.
-                        # But if the image is static, we don't need to swap at all!
-                        # We can just draw once and wait.
-                        
-                        # However, if we just set it and forget it, any other draw operation (like from another thread?)
-                        # No, we are the only thread drawing.
-                        
-                        # Optimization: If mode is image and we already drew it, just sleep.
-                        # We need a flag to know if we need to redraw (e.g. rotation changed).
-                        # But set_rotations calls _safe_set_image directly to force update.
-                        # So here in the loop, we can just sleep if it's static image.
-                        
-                        time.sleep(0.1)
-                    
-                    elif self.current_mode == "video":
-                        if self.current_video_path:
-                            # Release lock for video playback as it has its own loop
-                            # But wait, _play_video needs the lock too?
-                            # If we release lock here, init_matrix might run.
-                            # If we hold lock here, init_matrix will block until video is done?
-                            # Video playback is a loop. We shouldn't block init_matrix for the whole video.
-                            pass
-                        else:
-                            time.sleep(0.1)
-                    
-                    elif self.current_mode == "slideshow":
-                        # Same issue as video
-                        pass
-                    
-                    elif self.current_mode == "draw":
-                        # Drawing is handled by event updates, just keep display active
-                        time.sleep(0.1)
-                
-                # Handle long running modes outside the main lock, but they need to check lock internally
-                if self.current_mode == "video" and self.current_video_path:
+                self._apply_commands()
+                if not MATRIX_AVAILABLE or not self.matrix or not self.offscreen_canvas:
+                    self.commands.wait()
+                elif self.current_mode == "draw":
+                    self._render_draw_buffer()
+                    self.commands.wait()
+                elif self.current_mode == "video" and self.current_video_path:
                     self._play_video(self.current_video_path, mode=self.current_video_mode)
                 elif self.current_mode == "slideshow":
                     self._run_slideshow_step()
-                    
+                else:
+                    # Color and image are drawn once when their command is applied; nothing to do until the next
+                    self.commands.wait()
             except Exception as e:
                 print(f"Error in run loop: {e}")
-                time.sleep(1)
+                self.commands.wait(1)
 
     def _run_slideshow_step(self):
         if not self.slideshow_files:
             self.current_mode = "color"
             return
 
+        serial = self.content_serial
         try:
             file = self.slideshow_files[self.slideshow_index]
-            filepath = os.path.join('web/static/sd_card', file)
+            entry = media_index.get(file)
             
-            if not os.path.exists(filepath):
+            if entry is None:
                 # Skip missing files
                 self.slideshow_index = (self.slideshow_index + 1) % len(self.slideshow_files)
                 return
 
-            # Try to load config
-            mode = 'clone'
-            config_path = filepath + '.json'
-            if os.path.exists(config_path):
-                try:
-                    with open(config_path, 'r') as f:
-                        config = json.load(f)
-                        mode = config.get('mode', 'clone')
-                except:
-                    pass
+            filepath = os.path.join(media_index.folder, file)
+            mode = entry['mode']
+            key = (file, mode, self._layout_key())
+            prepared = self.prefetcher.take(key)
+
+            # Queue the following slides while this one shows
+            upcoming = []
+            for offset in range(1, self.prefetch_depth + 1):
+                next_key = self._slide_key(self.slideshow_index + offset)
+                if next_key and next_key not in upcoming:
+                    upcoming.append(next_key)
+            self.prefetcher.want(upcoming)
 
             ext = file.split('.')[-1].lower()
             if ext in ['jpg', 'jpeg', 'png']:
                 try:
-                    bg = self._process_image(filepath, mode)
-                    
-                    with self.matrix_lock:
-                        if self.matrix and self.offscreen_canvas:
-                            self._safe_set_image(self.offscreen_canvas, bg, mode)
-                            self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
-                    time.sleep(self.slide_duration)
+                    # The slide's deadline starts now, so decode time comes out of its duration
+                    self.scheduler.reset()
+                    self.scheduler.begin(self.slide_duration)
+                    frame = prepared if prepared is not None else self._prepare_slide(key)[0]
+                    self._show_frame(frame)
+                    self._wait_frame()
                 except Exception as e:
                     print(f"Error showing slide {file}: {e}")
             elif ext in ['gif', 'mp4']:
                 # Play video with duration limit, loop=True to fill the duration
-                self._play_video(filepath, loop=True, mode=mode, duration_limit=self.slide_duration)
-            
-            self.slideshow_index = (self.slideshow_index + 1) % len(self.slideshow_files)
+                self._play_video(filepath, loop=True, mode=mode, duration_limit=self.slide_duration,
+                                 decoder=prepared)
+
+            # A new slideshow (or other content) applied meanwhile starts from its own first slide
+            if self.content_serial == serial:
+                self.slideshow_index = (self.slideshow_index + 1) % len(self.slideshow_files)
         except Exception as e:
             print(f"Error in slideshow step: {e}")
-            time.sleep(1)
+            self.commands.wait(1)
+
+    def _slide_key(self, index):
+        file = self.slideshow_files[index % len(self.slideshow_files)]
+        entry = media_index.get(file)
+        if entry is None:
+            return None
+        return (file, entry['mode'], self._layout_key())
+
+    def _prepare_slide(self, key):
+        """Decode a slide ahead of time; returns (prepared, nbytes) for the prefetcher"""
+        file, mode, (rotations, mirrors) = key
+        filepath = os.path.join(media_index.folder, file)
+        ext = file.split('.')[-1].lower()
+        if ext in ['jpg', 'jpeg', 'png']:
+            canvas = self.offscreen_canvas
+            width, height = (canvas.width, canvas.height) if canvas else (128, 64)
+            frame = self.compositor.to_array(self._process_image(filepath, mode), width, height)
+            frame = self.compositor.compose(frame, rotations, mirrors)
+            return frame, frame.nbytes
+        if media_transcode.is_current(media_store.canonical(filepath), mode):
+            return None, 0  # Memory-mapped at playback, nothing to decode
+        if ext == 'gif' and not self._gif_streams(filepath, mode):
+            self._load_gif_frames(filepath, mode)  # Held by the frame cache, which has its own budget
+            return None, 0
+        # A started decoder fills its bounded queue and then waits for playback
+        decoder_class = GifDecoder if ext == 'gif' else VideoDecoder
+        decoder = decoder_class(filepath, mode, rotations, mirrors, loop=True, metrics=self.metrics)
+        decoder.start()
+        return decoder, decoder.buffer.maxsize * 128 * 64 * 3
+
+    def _render_layout(self, frame, mode):
+        """Resize a frame and place it on the 128x64 canvas for the layout mode"""
+        if mode == 'split':
+            return frame.resize((128, 64))
+
+        # Clone, Matrix A, Matrix B -> Target is 64x64
+        small_img = frame.resize((64, 64))
+        bg = Image.new('RGB', (128, 64), (0, 0, 0))
+        if mode == 'clone':
+            bg.paste(small_img, (0, 0))
+            bg.paste(small_img, (64, 0))
+        elif mode == 'matrix_a':
+            bg.paste(small_img, (0, 0))
+        elif mode == 'matrix_b':
+            bg.paste(small_img, (64, 0))
+        return bg
 
-    def _play_video(self, path, loop=True, mode='clone', duration_limit=None):
+    def _layout_key(self):
+        return (tuple(self.panel_rotations), tuple(self.panel_mirrors))
+
+    def _gif_streams(self, path, mode):
+        """True if a GIF is too large to cache decoded (over gif_stream_mb, or the whole frame cache);
+        it is then decoded as it plays"""
+        key = frame_cache_key(path, mode, self.panel_rotations, self.panel_mirrors, media_store.digest_of(path))
+        if self.frame_cache.contains(key):
+            return False
+        with Image.open(path) as gif:
+            frames = getattr(gif, 'n_frames', 1)  # Walks the block structure without decoding pixels
+        return frames * IndexedFrame.MAX_BYTES > min(self.gif_stream_bytes, self.frame_cache.max_bytes)
+
+    def _load_gif_frames(self, path, mode):
+        """Return pre-rendered (IndexedFrame, duration) pairs for a GIF, decoding only on a cache miss"""
+        key = frame_cache_key(path, mode, self.panel_rotations, self.panel_mirrors, media_store.digest_of(path))
+        frames = self.frame_cache.get(key)
+        if frames is not None:
+            return frames
+
+        frames = []
+        palette = None  # Carried from frame to frame, so frames share it while their colors fit
+        metrics = self.metrics
+        gif = Image.open(path)
+        try:
+            while True:
+                with metrics.timed('decode'):
+                    rgb = gif.convert('RGB')
+                with metrics.timed('resize'):
+                    pil_img = self._render_layout(rgb, mode)
+                    del rgb  # Drop the full-size frame before composing, it dominates peak memory
+                with metrics.timed('compose'):
+                    frame = self.compositor.compose(np.asarray(pil_img), self.panel_rotations, self.panel_mirrors)
+                    frame = IndexedFrame(frame, palette)
+                    palette = frame.palette
+                frames.append((frame, gif.info.get('duration', 100) / 1000.0))
+                with metrics.timed('decode'):
+                    gif.seek(gif.tell() + 1)
+        except EOFError:
+            pass
+
+        if frames:
+            self.frame_cache.put(key, frames)
+        return frames
+
+    def _show_frame(self, frame):
+        """Blit an already composed frame and swap it onto the panels"""
+        with self.matrix_lock:
+            if self.matrix and self.offscreen_canvas:
+                with self.metrics.timed('blit'):
+                    self.compositor.blit(self.offscreen_canvas, frame)
+                self._swap()
+
+    def _play_native(self, path, native, loop, duration_limit):
+        """Play memory-mapped transcoded frames; compose reads the mapped pages directly"""
+        start_time = time.time()
+        self.scheduler.reset()
+        while (self.current_mode == "video" and self.current_video_path == path) or (self.current_mode == "slideshow"):
+            for index, duration in enumerate(native.durations):
+                if self._apply_commands():
+                    return
+                if (self.current_mode == "video" and self.current_video_path != path) or (self.current_mode != "video" and self.current_mode != "slideshow"):
+                    return
+                if duration_limit and (time.time() - start_time > duration_limit):
+                    return
+
+                if not self.scheduler.begin(duration):
+                    self.metrics.frame_dropped()
+                    continue
+                with self.metrics.timed('compose'):
+                    frame = self.compositor.compose(native.layout(index), self.panel_rotations, self.panel_mirrors)
+                self._show_frame(frame)
+                if self._wait_frame():
+                    return
+            if not loop:
+                return
+
+    def _play_stream(self, stream, mode):
+        """Show GIF frames as their bytes arrive, looping once the upload is complete until the
+        processed file takes over"""
+        def stopped():
+            # Checked while waiting for bytes too, which can take as long as the upload stalls: settings
+            # are applied right here, new content is left queued and ends playback
+            self._apply_commands(SETTINGS_SLOTS)
+            return (self.commands.pending('content') or self.current_mode != "video"
+                    or self.current_video_path != stream.path)
+
+        reader = stream.open_reader(stopped)
+        try:
+            gif = Image.open(reader)
+            self.scheduler.reset()
+            while True:
+                if self._apply_commands() or stopped():
+                    break
+                with self.metrics.timed('decode'):
+                    rgb = gif.convert('RGB')
+                with self.metrics.timed('resize'):
+                    pil_img = self._render_layout(rgb, mode)
+                with self.metrics.timed('compose'):
+                    frame = self.compositor.compose(np.asarray(pil_img), self.panel_rotations, self.panel_mirrors)
+                # Late frames are still shown: arrival, not decode, is what holds playback back here
+                self.scheduler.begin(gif.info.get('duration', 100) / 1000.0)
+                self._show_frame(frame)
+                if self._wait_frame():
+                    break
+                try:
+                    gif.seek(gif.tell() + 1)
+                except EOFError:
+                    if not stream.complete:
+                        raise
+                    gif.seek(0)
+        except EOFError:
+            pass
+        except Exception as e:
+            if not (stopped() or stream.failed):
+                print(f"Error playing upload stream: {e}")
+        finally:
+            reader.close()
+
+    def _play_video(self, path, loop=True, mode='clone', duration_limit=None, decoder=None):
+        """decoder: an already started VideoDecoder for path (slideshow prefetch)"""
         try:
             ext = path.split('.')[-1].lower()
             start_time = time.time()
-            
-            if ext == 'gif':
+
+            stream = self.upload_stream
+            if stream is not None and stream.path == path:
+                if not (stream.final_path or stream.failed):
+                    # Also once complete: the temporary file is still there until the route moves it
+                    self._play_stream(stream, mode)
+                    return
+                self.upload_stream = None
+                if stream.final_path:
+                    # Moved into place: play it from there until the processed frames take over
+                    path = self.current_video_path = stream.final_path
+
+            native = media_transcode.open_native(media_store.canonical(path), mode)
+            if native is not None:
+                if decoder:
+                    decoder.stop()
+                self._play_native(path, native, loop, duration_limit)
+                return
+
+            streamed = ext == 'gif' and (isinstance(decoder, GifDecoder) or self._gif_streams(path, mode))
+            if ext == 'gif' and not streamed:
                 try:
-                    gif = Image.open(path)
-                    frames = []
-                    try:
-                        while True:
-                            # Pre-process frames
-                            frame = gif.copy().convert('RGB')
-                            frames.append((frame, gif.info.get('duration', 100) / 1000.0))
-                            gif.seek(gif.tell() + 1)
-                    except EOFError:
-                        pass
-                    
-                    if not frames:
-                        print("No frames found in GIF")
-                        if self.current_mode == "video": self.current_mode = "color"
-                        return
+                    layout = None
+                    frames = None
+                    self.scheduler.reset()
 
                     # Play loop
                     while (self.current_mode == "video" and self.current_video_path == path) or (self.current_mode == "slideshow"):
                         if duration_limit and (time.time() - start_time > duration_limit):
                             return
 
+                        # Re-resolve frames when the panel layout changed (rotate/mirror while playing)
+                        if layout != self._layout_key():
+                            layout = self._layout_key()
+                            frames = self._load_gif_frames(path, mode)
+                            if not frames:
+                                print("No frames found in GIF")
+                                if self.current_mode == "video": self.current_mode = "color"
+                                return
+
                         for frame, duration in frames:
+                            if self._apply_commands():
+                                return
                             if (self.current_mode == "video" and self.current_video_path != path) or (self.current_mode != "video" and self.current_mode != "slideshow"):
                                 return
                             
                             if duration_limit and (time.time() - start_time > duration_limit):
                                 return
-                            
-                            # Resize/Compose frame based on mode
-                            pil_img = frame
-                            if mode == 'split':
-                                pil_img = pil_img.resize((128, 64))
-                            else:
-                                # Clone, Matrix A, Matrix B -> Target is 64x64
-                                small_img = pil_img.resize((64, 64))
-                                bg = Image.new('RGB', (128, 64), (0, 0, 0))
-                                if mode == 'clone':
-                                    bg.paste(small_img, (0, 0))
-                                    bg.paste(small_img, (64, 0))
-                                elif mode == 'matrix_a':
-                                    bg.paste(small_img, (0, 0))
-                                elif mode == 'matrix_b':
-                                    bg.paste(small_img, (64, 0))
-                                pil_img = bg
-
-                            with self.matrix_lock:
-                                if self.matrix and self.offscreen_canvas:
-                                    self._safe_set_image(self.offscreen_canvas, pil_img, mode)
-                                    self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
-                            
-                            time.sleep(duration)
-                        
-                        if not loop:
-                            return
+
+                            if layout != self._layout_key():
+                                break
+
+                            if not self.scheduler.begin(duration):
+                                self.metrics.frame_dropped()
+                                continue
+                            with self.metrics.timed('compose'):
+                                rgb = frame.rgb()
+                            self._show_frame(rgb)
+                            if self._wait_frame():
+                                return
+                        else:
+                            if not loop:
+                                return
 
                 except Exception as e:
                     print(f"Error playing GIF: {e}")
-                    time.sleep(1)
+                    self.commands.wait(1)
 
-            elif ext == 'mp4':
+            elif ext == 'mp4' or streamed:
+                decoder_class = GifDecoder if streamed else VideoDecoder
                 try:
-                    cap = cv2.VideoCapture(path)
-                    if not cap.isOpened():
-                        print(f"Failed to open video: {path}")
+                    if decoder is None:
+                        decoder = decoder_class(path, mode, self.panel_rotations, self.panel_mirrors, loop=loop,
+                                                metrics=self.metrics)
+                        decoder.start()
+                    layout = (tuple(decoder.rotations), tuple(decoder.mirrors))
+                    self.active_decoder = decoder
+                    decoder.opened.wait(5.0)
+                    if not decoder.ok:
                         if self.current_mode == "video": self.current_mode = "color"
                         return
 
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    if fps <= 0: fps = 30
-                    delay = 1.0 / fps
+                    self.scheduler.reset()
                     
-                    while (self.current_mode == "video" and self.current_video_path == path and cap.isOpened()) or (self.current_mode == "slideshow" and cap.isOpened()):
+                    while True:
+                        if self._apply_commands():
+                            break
+                        if not ((self.current_mode == "video" and self.current_video_path == path) or (self.current_mode == "slideshow")):
+                            break
                         if duration_limit and (time.time() - start_time > duration_limit):
                             break
 
-                        ret, frame = cap.read()
-                        if not ret:
-                            if loop:
-                                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                                continue
-                            else:
+                        # Restart the decoder at the current position when the panel layout changes
+                        if layout != self._layout_key():
+                            layout = self._layout_key()
+                            old = decoder
+                            old.stop()
+                            decoder = decoder_class(path, mode, self.panel_rotations, self.panel_mirrors,
+                                                    loop=loop, start_frame=old.position, metrics=self.metrics)
+                            decoder.shown, decoder.dropped, decoder.underruns = old.shown, old.dropped, old.underruns
+                            self.active_decoder = decoder
+                            decoder.start()
+
+                        frame = decoder.get(timeout=1.0)
+                        if frame is None:
+                            if decoder.finished:
                                 break
-                        
-                        try:
-                            # Convert BGR to RGB
-                            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                            pil_img = Image.fromarray(frame)
-                            
-                            # Resize logic based on mode
-                            if mode == 'split':
-                                pil_img = pil_img.resize((128, 64))
-                            else:
-                                # Clone, Matrix A, Matrix B -> Target is 64x64
-                                small_img = pil_img.resize((64, 64))
-                                bg = Image.new('RGB', (128, 64), (0, 0, 0))
-                                if mode == 'clone':
-                                    bg.paste(small_img, (0, 0))
-                                    bg.paste(small_img, (64, 0))
-                                elif mode == 'matrix_a':
-                                    bg.paste(small_img, (0, 0))
-                                elif mode == 'matrix_b':
-                                    bg.paste(small_img, (64, 0))
-                                pil_img = bg
-                            
-                            with self.matrix_lock:
-                                if self.matrix and self.offscreen_canvas:
-                                    self._safe_set_image(self.offscreen_canvas, pil_img, mode)
-                                    self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
-                        except Exception as e:
-                            print(f"Error processing frame: {e}")
-                        
-                        time.sleep(delay)
-                    cap.release()
+                            continue
+
+                        # Skip frames whose slot already passed instead of drifting behind the video clock
+                        if not self.scheduler.begin(decoder.duration):
+                            decoder.dropped += 1
+                            self.metrics.frame_dropped()
+                            continue
+
+                        self._show_frame(frame)
+                        decoder.shown += 1
+                        if self._wait_frame():
+                            break
                 except Exception as e:
-                    print(f"Error playing MP4: {e}")
+                    print(f"Error playing {ext.upper()}: {e}")
+                finally:
+                    if decoder:
+                        self.active_decoder = None
+                        decoder.stop()
+                        self.video_stats = decoder.stats()
+                        self.video_stats.update(self.scheduler.stats())
+                        print(ext.upper() + " {path}: decoded {decoded} ({decode_fps:.1f} fps), shown {shown}, "
+                              "dropped {dropped}, underruns {underruns}, "
+                              "lateness {mean_lateness_ms:.1f} ms, jitter {jitter_ms:.1f} ms".format(**self.video_stats))
         except Exception as e:
             print(f"Critical error in _play_video: {e}")
-            time.sleep(1)
+            self.commands.wait(1)
+
+    def queue_draw_ops(self, ops):
+        """Paint ops into the draw framebuffer; the render thread blits it once for any number of batches"""
+        with self.draw_lock:
+            draw_ops.apply_ops(self.draw_buffer, ops)
+            self.draw_dirty = True
+        self.commands.put('content', ('draw',))
+
+    def get_draw_buffer(self):
+        with self.draw_lock:
+            return self.draw_buffer.copy()
+
+    def _render_draw_buffer(self):
+        with self.draw_lock:
+            if not self.draw_dirty:
+                return
+            self.draw_dirty = False
+            # compose() gathers into a new array, so the snapshot is taken under the draw lock
+            with self.metrics.timed('compose'):
+                frame = self.compositor.compose(self.draw_buffer, self.panel_rotations, self.panel_mirrors)
+
+        with self.matrix_lock:
+            if self.matrix and self.offscreen_canvas:
+                # Diffed against what each hardware buffer last held, so both buffers converge on the framebuffer
+                with self.metrics.timed('blit'):
+                    self.compositor.blit(self.offscreen_canvas, frame)
+                self._swap()
+
+    def metrics_text(self):
+        """Render metrics plus current queue/cache/playback state in Prometheus text format"""
+        gauges = {
+            ('led_frame_cache_bytes', ()): self.frame_cache.size_bytes,
+            ('led_frame_cache_entries', ()): len(self.frame_cache),
+        }
+        counters = {
+            ('led_blit_pixels_written_total', ()): self.compositor.pixels_written,
+            ('led_render_commands_coalesced_total', ()): self.commands.coalesced,
+        }
+        decoder = self.active_decoder
+        gauges[('led_queue_depth', (('queue', 'video_decoder'),))] = decoder.buffer.qsize() if decoder else 0
+        gauges[('led_queue_depth', (('queue', 'media_jobs'),))] = self.jobs.pending()
+        gauges[('led_queue_depth', (('queue', 'render_commands'),))] = len(self.commands)
+        schedule = self.scheduler.stats()
+        gauges[('led_playback_lateness_seconds', (('stat', 'mean'),))] = schedule['mean_lateness_ms'] / 1000
+        gauges[('led_playback_lateness_seconds', (('stat', 'max'),))] = schedule['max_lateness_ms'] / 1000
+        gauges[('led_playback_jitter_seconds', ())] = schedule['jitter_ms'] / 1000
+        return self.metrics.render(gauges, mode=self.current_mode, counters=counters)
 
     def set_color(self, r, g, b):
-        self.current_mode = "color"
-        self.current_color = (r, g, b)
+        self.commands.put('content', ('color', (r, g, b)))
 
     def _process_image(self, image_path, mode='clone'):
-        img = Image.open(image_path)
-        
-        # Safety check for very large images to prevent OOM
-        if img.width > 4000 or img.height > 4000:
-            print("Image too large, resizing before processing")
-            img.thumbnail((2000, 2000))
-
+        # Decode and resize are interleaved (draft mode, reduce), so the whole call counts as decode
+        with self.metrics.timed('decode'):
+            return self._decode_image(image_path, mode)
+
+    def _decode_image(self, image_path, mode):
+        native = media_transcode.open_native(media_store.canonical(image_path), mode)
+        if native is not None:
+            return Image.fromarray(native.layout(0))
+
+        # Same content decoded before (any folder, any name): reuse the result
+        key = frame_cache_key(image_path, mode, (), (), media_store.digest_of(image_path))
+        cached = self.frame_cache.get(key)
+        if cached is not None:
+            return Image.fromarray(cached[0][0])
+
+        # Decoded at reduced resolution (JPEG draft, reduce) and checked for decompression bombs
         bg = Image.new('RGB', (128, 64), (0, 0, 0))
 
         if mode == 'split':
-            img.thumbnail((128, 64), Image.Resampling.LANCZOS)
+            img = media_transcode.load_thumbnail(image_path, (128, 64))
             x = (128 - img.width) // 2
             y = (64 - img.height) // 2
             bg.paste(img, (x, y))
         else:
             # Clone, Matrix A, Matrix B -> Target is 64x64
-            img.thumbnail((64, 64), Image.Resampling.LANCZOS)
+            img = media_transcode.load_thumbnail(image_path, (64, 64))
             x = (64 - img.width) // 2
             y = (64 - img.height) // 2
             
@@ -532,44 +835,65 @@ class MatrixController:
                 bg.paste(img, (x, y))      # Left
             elif mode == 'matrix_b':
                 bg.paste(img, (x + 64, y)) # Right
+        self.frame_cache.put(key, [(np.asarray(bg), 0.0)])
         return bg
 
     def set_image(self, image_path, mode='clone'):
-        try:
-            bg = self._process_image(image_path, mode)
-            
-            self.current_image = bg
-            self.current_mode = "image"
-            
-            # Force immediate update
-            with self.matrix_lock:
-                if self.matrix and self.offscreen_canvas:
-                    self._safe_set_image(self.offscreen_canvas, self.current_image, mode)
-                    self.offscreen_canvas = self.matrix.SwapOnVSync(self.offscreen_canvas)
-                    
-        except Exception as e:
-            print(f"Error setting image: {e}")
+        # Decoded on the render thread (usually a native file or frame cache hit by now)
+        self.commands.put('content', ('image', image_path, mode))
 
     def set_video(self, video_path, mode='clone'):
-        self.current_video_path = video_path
-        self.current_video_mode = mode
-        self.current_mode = "video"
+        self.commands.put('content', ('video', video_path, mode, None))
+
+    def show_when_processed(self, path, mode='clone', stream=None):
+        """Preprocess a live upload in the worker pool and display it once that is done; returns the job.
+        Only the newest upload is shown. stream: the upload is already playing from its UploadStream,
+        which keeps going until the processed file takes over (unless the display moved on)."""
+        token = object()
+        self.awaiting_upload = token
+        is_still = path.rsplit('.', 1)[-1].lower() in media_transcode.STILL_EXTENSIONS
+
+        def on_done(job):
+            if self.awaiting_upload is not token:
+                return
+            self.awaiting_upload = None
+            if stream is not None and self.upload_stream is not stream and self.current_video_path != path:
+                # The display moved on (the player releasing a finished stream switches to path instead)
+                return
+            if is_still:
+                self.set_image(path, mode)
+            else:
+                self.set_video(path, mode)
+
+        # The route checked capacity before keeping the file
+        return self.jobs.submit(media_store.canonical(path), mode, os.path.basename(path), on_done, bounded=False)
+
+    def set_stream(self, stream, mode='clone'):
+        """Start playing a GIF upload that is still being received"""
+        self.commands.put('content', ('video', stream.path, mode, stream))
 
     def clear(self):
         self.set_color(0, 0, 0)
 
     def set_slideshow(self, files, duration):
-        self.slideshow_files = files
-        self.slide_duration = float(duration)
-        self.slideshow_index = 0
-        self.current_mode = "slideshow"
+        self.commands.put('content', ('slideshow', list(files), float(duration)))
 
-    def set_rotations(self, rotations):
-        """Set panel rotations for each panel in the matrix"""
-        # This is a no-op in the base class, meant to be overridden if needed
-        pass
+# Media workers import this file as __mp_main__ on their way to media_jobs; the state below is the server's
+if __name__ != '__mp_main__':
+    # Ensure directories exist
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['SD_CARD_FOLDER'], exist_ok=True)
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    # SD card listings, slideshow and playback read file metadata from here instead of the folder
+    media_index = MediaIndex(os.path.join(app.instance_path, 'media.db'), app.config['SD_CARD_FOLDER'])
+
+    # Uploads are stored once per content; live_cache and sd_card entries hard link to the blobs
+    media_store = MediaStore(os.path.join(app.instance_path, 'blobs'))
 
-matrix_controller = MatrixController()
+    matrix_controller = MatrixController()
+    # Transcode SD card files uploaded before the native format existed (or changed since)
+    matrix_controller.transcoder.backfill(app.config['SD_CARD_FOLDER'], media_mode, media_store.canonical)
 
 # Auth Decorators
 def approved_required(f):
@@ -704,6 +1028,13 @@ def admin_delete(user_id):
         return jsonify({'success': True})
     return jsonify({'error': 'User not found'}), 404
 
+@app.route('/metrics')
+@login_required
+def metrics():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return Response(matrix_controller.metrics_text(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 @login_required
 @approved_required
@@ -722,25 +1053,100 @@ def upload_file():
             return jsonify({'error': 'No selected file'}), 400
             
         if file and allowed_file(file.filename):
+            matrix_controller.jobs.check_capacity()
             filename = secure_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             
-            # Always save/overwrite for live upload
-            file.save(filepath)
+            # Always save/overwrite for live upload; identical content reuses the stored blob
+            tmp, digest = receive_upload(file, app.config['UPLOAD_FOLDER'])
+            media_store.adopt(tmp, digest, filepath)
+            media_store.gc()
             
             mode = request.form.get('mode', 'clone')
             ext = filename.rsplit('.', 1)[1].lower()
             
-            if ext in ['jpg', 'jpeg', 'png']:
-                matrix_controller.set_image(filepath, mode)
-            elif ext in ['gif', 'mp4']:
+            if ext == 'mp4':
+                # Starts right away from the decoder thread; the job makes replays decode-free
                 matrix_controller.set_video(filepath, mode)
+                job = matrix_controller.jobs.submit(media_store.canonical(filepath), mode, filename, bounded=False)
+            else:
+                job = matrix_controller.show_when_processed(filepath, mode)
                 
-            return jsonify({'success': True, 'filename': filename, 'mode': mode})
+            return jsonify({'success': True, 'filename': filename, 'mode': mode, 'digest': digest,
+                            'job': job.id})
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Error in upload_file: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/upload-stream', methods=['POST'])
+@login_required
+@approved_required
+def upload_stream():
+    """Live upload with the raw file as the request body, displayed while it arrives"""
+    filename = secure_filename(request.args.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    mode = request.args.get('mode', 'clone')
+    ext = filename.rsplit('.', 1)[1].lower()
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    try:
+        matrix_controller.jobs.check_capacity()
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+    # Received under a temporary name: filepath may be a link to a blob other files share
+    fd, tmp = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.part')
+    os.close(fd)
+    stream = UploadStream(tmp)
+    playing = False
+
+    def abort():
+        stream.fail()
+        if matrix_controller.upload_stream is stream:
+            matrix_controller.clear()
+
+    try:
+        while True:
+            chunk = request.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if stream.size + len(chunk) > app.config['MAX_CONTENT_LENGTH']:
+                abort()
+                return jsonify({'error': 'File too large'}), 413
+            stream.write(chunk)
+            # GIFs start playing from the first chunk; MP4 needs the whole file (OpenCV, index at the end)
+            if ext == 'gif' and not playing:
+                matrix_controller.set_stream(stream, mode)
+                playing = True
+        if stream.size == 0:
+            abort()
+            return jsonify({'error': 'Empty upload'}), 400
+        stream.finish()
+        media_store.adopt(tmp, stream.digest, filepath)
+        stream.moved(filepath)
+        media_store.gc()
+    except RequestEntityTooLarge:
+        # Content-Length over MAX_CONTENT_LENGTH: werkzeug refuses to read the body
+        abort()
+        return jsonify({'error': 'File too large'}), 413
+    except Exception as e:
+        print(f"Error in upload_stream: {e}")
+        abort()
+        return jsonify({'error': str(e)}), 500
+
+    if ext == 'mp4':
+        matrix_controller.set_video(filepath, mode)
+        job = matrix_controller.jobs.submit(media_store.canonical(filepath), mode, filename, bounded=False)
+    elif matrix_controller.upload_stream is stream:
+        # The GIF keeps looping from the stream until its processed frames are ready
+        job = matrix_controller.show_when_processed(filepath, mode, stream)
+    else:
+        job = matrix_controller.show_when_processed(filepath, mode)
+    return jsonify({'success': True, 'filename': filename, 'mode': mode, 'bytes': stream.size,
+                    'digest': stream.digest, 'job': job.id})
+
 @app.route('/sd-upload', methods=['POST'])
 @login_required
 @approved_required
@@ -753,9 +1159,17 @@ def sd_upload():
             return jsonify({'error': 'No selected file'}), 400
             
         if file and allowed_file(file.filename):
+            matrix_controller.jobs.check_capacity()
             filename = secure_filename(file.filename)
+            tmp, digest = receive_upload(file, app.config['SD_CARD_FOLDER'])
             filepath = os.path.join(app.config['SD_CARD_FOLDER'], filename)
-            file.save(filepath)
+            # Files from before the store aren't linked to a blob: hash them to compare
+            if os.path.exists(filepath) and (media_store.digest_of(filepath) or hash_file(filepath)) != digest:
+                # Different content under a name that is taken: keep both
+                stem, ext = filename.rsplit('.', 1)
+                filename = f'{stem}-{digest[:8]}.{ext}'
+                filepath = os.path.join(app.config['SD_CARD_FOLDER'], filename)
+            media_store.adopt(tmp, digest, filepath)
             
             mode = request.form.get('mode', 'clone')
             
@@ -769,21 +1183,57 @@ def sd_upload():
             }
             with open(config_path, 'w') as f:
                 json.dump(config, f)
+            media_index.refresh_file(filename)
+
+            # Decode once into the panel-native format in the worker pool (shared by content)
+            job = matrix_controller.jobs.submit(media_store.canonical(filepath), mode, filename, bounded=False)
+            media_store.gc()
                 
-            return jsonify({'success': True, 'filename': filename})
+            return jsonify({'success': True, 'filename': filename, 'digest': digest, 'job': job.id})
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs')
+@login_required
+@approved_required
+def list_jobs():
+    """Recent preprocessing jobs, newest first"""
+    jobs = matrix_controller.jobs
+    return jsonify({'jobs': [job.to_dict() for job in reversed(jobs.recent())], 'pending': jobs.pending()})
+
+@app.route('/jobs/<job_id>')
+@login_required
+@approved_required
+def job_status(job_id):
+    job = matrix_controller.jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/sd-files')
 @login_required
 @approved_required
 def get_sd_files():
-    files = []
     try:
-        for filename in os.listdir(app.config['SD_CARD_FOLDER']):
-            if allowed_file(filename):
-                files.append(filename)
-        return jsonify(files)
+        # Without offset/limit: the plain filename list older clients expect
+        if 'offset' not in request.args and 'limit' not in request.args:
+            return jsonify(media_index.filenames())
+
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = max(1, min(int(request.args.get('limit', 100)), MAX_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be integers'}), 400
+        items, total = media_index.page(offset, limit)
+        return jsonify({
+            'files': [item['filename'] for item in items],
+            'items': items,
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -797,23 +1247,15 @@ def play_sd_file():
         if not filename:
             return jsonify({'error': 'No filename provided'}), 400
             
-        filepath = os.path.join(app.config['SD_CARD_FOLDER'], filename)
-        if not os.path.exists(filepath):
-            return jsonify({'error': 'File not found'}), 404
-            
         if not allowed_file(filename):
             return jsonify({'error': 'Invalid file type'}), 400
+
+        entry = media_index.get(filename)
+        if entry is None:
+            return jsonify({'error': 'File not found'}), 404
             
-        # Try to load config
-        mode = 'clone'
-        config_path = filepath + '.json'
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-                    mode = config.get('mode', 'clone')
-            except:
-                pass
+        filepath = os.path.join(app.config['SD_CARD_FOLDER'], filename)
+        mode = entry['mode']
 
         ext = filename.rsplit('.', 1)[1].lower()
         if ext in ['jpg', 'jpeg', 'png']:
@@ -842,10 +1284,14 @@ def settings():
             flat_data = request.json
             
             # Reconstruct structure
-            # Preserve existing rotations as they are not in the form
+            # Client settings are updated in place: rotations, mirrors and anything else not in the form are kept
             current_settings = load_settings()
-            current_rotations = current_settings.get('client', {}).get('panel_rotations', [0, 0])
-            current_mirrors = current_settings.get('client', {}).get('panel_mirrors', [False, False])
+            client = current_settings.get('client', {})
+            current_cache_mb = client.get('frame_cache_mb', 64)
+            current_prefetch_slides = client.get('prefetch_slides', 2)
+            current_prefetch_mb = client.get('prefetch_mb', 16)
+            current_workers = client.get('preprocess_workers')
+            current_stream_mb = client.get('gif_stream_mb', 4)
 
             new_settings = {
                 "hardware": {
@@ -864,19 +1310,30 @@ def settings():
                     "pwm_bits": int(flat_data.get('pwm_bits', 11)),
                     "limit_refresh_rate_hz": int(flat_data.get('limit_refresh_rate_hz', 0))
                 },
-                "client": {
-                    "brightness": int(flat_data.get('brightness', 50)),
-                    "slide_duration": float(flat_data.get('slide_duration', 10)),
-                    "panel_rotations": current_rotations,
-                    "panel_mirrors": current_mirrors
-                }
+                "client": client
             }
+            client.update({
+                "brightness": int(flat_data.get('brightness', 50)),
+                "slide_duration": float(flat_data.get('slide_duration', 10)),
+                "frame_cache_mb": int(flat_data.get('frame_cache_mb', current_cache_mb)),
+                "prefetch_slides": int(flat_data.get('prefetch_slides', current_prefetch_slides)),
+                "prefetch_mb": int(flat_data.get('prefetch_mb', current_prefetch_mb)),
+                "gif_stream_mb": int(flat_data.get('gif_stream_mb', current_stream_mb))
+            })
+            # Empty means one worker per core; the pool is sized at startup
+            workers = flat_data.get('preprocess_workers', current_workers)
+            client['preprocess_workers'] = int(workers) if workers not in (None, '') else None
             
             with open('settings.json', 'w') as f:
                 json.dump(new_settings, f, indent=4)
             
-            # Re-init matrix with new settings
-            if not matrix_controller.init_matrix():
+            matrix_controller.frame_cache.set_limit(client['frame_cache_mb'] * 1024 * 1024)
+            matrix_controller.prefetch_depth = client['prefetch_slides']
+            matrix_controller.prefetcher.budget_bytes = client['prefetch_mb'] * 1024 * 1024
+            matrix_controller.gif_stream_bytes = client['gif_stream_mb'] * 1024 * 1024
+
+            # Re-init matrix with new settings (on the render thread, which owns the hardware)
+            if not matrix_controller.reinit_matrix().wait(HARDWARE_TIMEOUT):
                 raise Exception("Hardware initialization failed")
                 
             return jsonify({'success': True})
@@ -887,7 +1344,7 @@ def settings():
                 with open('settings.json', 'w') as f:
                     json.dump(backup_settings, f, indent=4)
                 # Try to restore matrix state
-                matrix_controller.init_matrix()
+                matrix_controller.reinit_matrix().wait(HARDWARE_TIMEOUT)
             
             # Failsafe: If we really crashed hard (e.g. segfault or unrecoverable), 
             # we might want to restart the service.
@@ -911,34 +1368,29 @@ def settings():
 @approved_required
 def draw_pixel():
     try:
-        data = request.json
-        x = int(data.get('x', 0))
-        y = int(data.get('y', 0))
-        color = data.get('color', '#000000')
-        size = int(data.get('size', 1))
-        
-        # Convert hex to rgb
-        h = color.lstrip('#')
-        rgb = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
-        
-        if matrix_controller.current_mode != "draw":
-            matrix_controller.current_mode = "draw"
-            # Clear canvas for drawing if switching modes
-            matrix_controller.offscreen_canvas.Fill(0, 0, 0)
-            
-        # Draw a square of size*size
-        for dx in range(size):
-            for dy in range(size):
-                px, py = x + dx, y + dy
-                if 0 <= px < 128 and 0 <= py < 64:
-                    matrix_controller.offscreen_canvas.SetPixel(px, py, rgb[0], rgb[1], rgb[2])
-        
-        matrix_controller.offscreen_canvas = matrix_controller.matrix.SwapOnVSync(matrix_controller.offscreen_canvas)
-        return jsonify({'success': True})
+        # Either a single {x, y, color, size} point or a batch {ops: [...]} of points, lines and fills
+        ops = draw_ops.parse_ops(request.json or {})
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f"Invalid draw request: {e}"}), 400
+
+    try:
+        matrix_controller.queue_draw_ops(ops)
+        return jsonify({'success': True, 'ops': len(ops)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/draw-state')
+@login_required
+@approved_required
+def draw_state():
+    """Current draw framebuffer as a 128x64 PNG, so the UI can restore the canvas"""
+    buf = BytesIO()
+    Image.fromarray(matrix_controller.get_draw_buffer()).save(buf, format='PNG')
+    buf.seek(0)
+    return send_file(buf, mimetype='image/png', max_age=0)
+
+
 @app.route('/color', methods=['POST'])
 @login_required
 @approved_required
@@ -976,6 +1428,9 @@ def delete_sd_file():
         # Also remove config if exists
         if os.path.exists(filepath + '.json'):
             os.remove(filepath + '.json')
+        media_transcode.remove(filepath)
+        media_index.remove(filename)
+        media_store.gc()
             
         return jsonify({'success': True})
     except Exception as e:
@@ -986,16 +1441,10 @@ def delete_sd_file():
 @approved_required
 def play_slideshow():
     try:
-        files = []
-        if os.path.exists(app.config['SD_CARD_FOLDER']):
-            for filename in os.listdir(app.config['SD_CARD_FOLDER']):
-                if allowed_file(filename):
-                    files.append(filename)
+        files = media_index.filenames() # Already in play order
         
         if not files:
             return jsonify({'error': 'No files to play'}), 400
-            
-        files.sort() # Play in order
         
         # Get duration from request, fallback to settings
         data = request.get_json(silent=True) or {}